@@ -0,0 +1,153 @@
+"""
+Per-user meal draws for batched weekly plans.
+
+MealPlanner.generate_weekly_plans_batch() plans many users' weeks at once.
+Sampling them from users x pool-size matrices (one random key per option
+per user) costs memory and time proportional to the catalogue, so for large
+catalogues it is slower than planning the users one by one. PoolSampler
+instead keeps each user's usage sparse (the few titles drawn so far this
+week) and draws by rejection:
+
+* every user draws a uniform index within their calorie window [lo, hi)
+  (the whole pool without a calorie margin),
+  and users whose pick was already used twice (or is the title to avoid,
+  e.g. lunch for dinner) simply draw again; accepted picks are uniform
+  among the allowed options;
+* a window is only sampled this way when it provably holds enough allowed
+  options: each exhausted title blocks at most max_copies positions (the
+  most pool positions any one title has);
+* the remaining users, and those still rejected after max_tries draws, are
+  resolved exactly from their window, widening it (as in
+  MealPlanner._calorie_window) while it lacks allowed options, with the
+  planner's usual fallbacks once the whole pool is used up.
+
+Work per draw is then proportional to the number of users, not the pool.
+"""
+from typing import Optional
+
+import numpy as np
+
+from recipe_store import CandidatePool
+
+# Upper bound on users x pool-size x draws-so-far cells in one exact draw
+EXACT_DRAW_CELLS = 1 << 22
+
+
+class PoolSampler:
+    """
+    One candidate pool's draws and usage counts for a batch of users.
+
+    titles are the recipes' title ids in pool order. Each user's window is
+    centred on their entry in targets and holds at least min_options
+    recipes; margin=None gives every user the whole pool. slots is how many
+    meals each user draws from this pool per week. All draws come from rng.
+    """
+
+    def __init__(self, pool: CandidatePool, titles: np.ndarray, targets: np.ndarray,
+                 margin: Optional[float], min_options: int, slots: int,
+                 rng: np.random.Generator, max_tries: int = 16):
+        n_users = len(targets)
+        self.pool = pool
+        self.targets = targets
+        self.margin = margin
+        self.min_options = min_options
+        if margin is not None:
+            self.lo, self.hi = pool.window_bounds(targets, margin, min_options)
+        else:
+            self.lo, self.hi = np.zeros(n_users, dtype=np.int64), np.full(n_users, pool.size)
+        # Renumber titles within the pool so they are small dense ids
+        self.titles = np.unique(titles, return_inverse=True)[1].astype(np.int32)
+        self.max_copies = int(np.bincount(self.titles).max()) if self.titles.size else 0
+        self.used = np.full((n_users, slots), -1, dtype=np.int32)
+        self.n_used = 0
+        self.exhausted = np.zeros(n_users, dtype=np.int32)
+        self.rng = rng
+        self.max_tries = max_tries
+
+    def counts(self, rows: np.ndarray, titles: np.ndarray) -> np.ndarray:
+        """How often each row's user has drawn the given title so far."""
+        return (self.used[rows, :self.n_used] == titles[:, None]).sum(axis=1)
+
+    def draw(self, avoid: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Pool index per user, uniform among the recipes in their window whose
+        title was used fewer than twice. A window with fewer than min_options
+        such recipes is widened until it has them; once the whole pool lacks
+        them, the draw is uniform over the pool. avoid holds one title per
+        user to leave out as well: its window then only needs one such recipe
+        with another title, and the title is only drawn when the pool has no
+        other.
+        """
+        lo, hi, min_options = self.lo, self.hi, self.min_options
+        n_users = len(lo)
+        width = hi - lo
+        result = np.full(n_users, -1, dtype=np.int64)
+
+        blocked = self.exhausted * self.max_copies
+        fast = width - blocked >= min_options
+        if avoid is not None:
+            fast &= width - blocked - self.max_copies >= 1
+
+        pending = np.flatnonzero(fast)
+        for _ in range(self.max_tries):
+            if pending.size == 0:
+                break
+            picks = lo[pending] + np.minimum(
+                (self.rng.random(pending.size) * width[pending]).astype(np.int64), width[pending] - 1
+            )
+            titles = self.titles[picks]
+            accepted = self.counts(pending, titles) < 2
+            if avoid is not None:
+                accepted &= titles != avoid[pending]
+            result[pending[accepted]] = picks[accepted]
+            pending = pending[~accepted]
+
+        exact = np.concatenate([np.flatnonzero(~fast), pending])
+        # Exact draws use users x pool matrices, so take them a bounded number of users at a time
+        step = max(1, EXACT_DRAW_CELLS // max(self.pool.size * max(self.n_used, 1), 1))
+        for start in range(0, exact.size, step):
+            rows = exact[start:start + step]
+            result[rows] = self._draw_exact(rows, None if avoid is None else avoid[rows])
+        return result
+
+    def _draw_exact(self, rows: np.ndarray, avoid: Optional[np.ndarray]) -> np.ndarray:
+        pool_index = np.arange(self.pool.size)
+        counts = (self.used[rows, :self.n_used, None] == self.titles[None, None, :]).sum(axis=1)
+        usable = counts < 2
+        min_options = self.min_options
+        if avoid is not None:
+            others = self.titles[None, :] != avoid[:, None]
+            usable &= others
+            min_options = 1
+
+        lo, hi = self.lo[rows], self.hi[rows]
+        in_window = (pool_index >= lo[:, None]) & (pool_index < hi[:, None])
+        options = usable & in_window
+        short = options.sum(axis=1) < min_options
+        if short.any() and self.margin is not None:
+            lo, hi = lo.copy(), hi.copy()
+            lo[short], hi[short] = self.pool.window_bounds(
+                self.targets[rows][short], self.margin, min_options, usable[short])
+            in_window = (pool_index >= lo[:, None]) & (pool_index < hi[:, None])
+            options = usable & in_window
+            short = options.sum(axis=1) < min_options
+        options[short] = in_window[short]
+
+        if avoid is not None:
+            # Past the usage limit, another title still beats repeating the avoided one
+            other_options = options & others
+            has_others = other_options.any(axis=1)
+            options[has_others] = other_options[has_others]
+
+        # Uniform among each row's options: the smallest random key wins
+        keys = self.rng.random(options.shape)
+        keys[~options] = 2.0
+        return keys.argmin(axis=1)
+
+    def add(self, picks: np.ndarray):
+        """Record one drawn pool index per user."""
+        titles = self.titles[picks]
+        rows = np.arange(len(picks))
+        self.exhausted += self.counts(rows, titles) == 1
+        self.used[:, self.n_used] = titles
+        self.n_used += 1
@@ -0,0 +1,272 @@
+"""
+Latency and throughput benchmarks for the meal planner.
+
+Runs a fixed set of cases and writes machine-readable results, so numbers
+from different commits (or machines) can be compared:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --compare bench.json          # ratios against a baseline
+    python benchmark.py --only weekly_plan,batch_500 --repeat 50
+    python benchmark.py --synthetic 100000 --output bench-100k.json
+
+Cases:
+  planner_construction     load CSVs and train the models (MealPlanner())
+  planner_from_artifacts   load CSVs and memory-map prebuilt models
+  filter_all_masks         cold _filter_by_preferences for all 512 preference masks
+  candidate_pools_cold     cold candidate pool build for all 512 masks
+  kmeans_clusters_cold     K-means cluster assignment of the whole catalogue
+  fallback_scoring         cluster/calorie-band fallback scoring (top 50)
+  weekly_plan              one generate_weekly_plan() (sample mode)
+  weekly_plan_optimize     the same in 'optimize' selection mode
+  weekly_plan_week_solver  the same refined by the week solver
+  horizon_84_days          a 12-week iter_plan_days() horizon
+  batch_100 / batch_500    generate_weekly_plans_batch() for a roster
+  replan_one_meal          replan_meals() for a single slot
+  request_predict          POST /predict_meal_plan through the Flask test client
+  request_predict_cached   the same for a seeded, already cached plan
+  request_batch_100        POST /predict_meal_plan/batch with 100 users
+
+Each case reports min/median/mean/p95/max seconds per run over --repeat
+runs (after --warmup runs), plus items per second where a run covers
+several items. Results go to stdout as a table and, with --output, to JSON
+together with the environment (git commit, library versions, catalogue
+size). The recipe CSVs can be swapped with --breakfast/--lunch, or
+--synthetic N generates a catalogue of N recipes (see synthetic_recipes.py)
+into a temporary directory, to see how the cases scale with catalogue size.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BREAKFAST = os.path.join(HERE, 'bf_final_updated_recipes_1.csv')
+DEFAULT_LUNCH = os.path.join(HERE, 'lunch_final_updated_recipes_1.csv')
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> List[float]:
+    """Wall-clock seconds of repeat calls to fn, after warmup untimed calls."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name: str, timings: List[float], items: int = 1) -> Dict:
+    values = np.asarray(timings)
+    median = float(np.median(values))
+    return {
+        'name': name,
+        'unit': 'seconds',
+        'repeat': len(values),
+        'items_per_run': items,
+        'min': float(values.min()),
+        'median': median,
+        'mean': float(values.mean()),
+        'p95': float(np.percentile(values, 95)),
+        'max': float(values.max()),
+        'items_per_second': items / median if median > 0 else None,
+    }
+
+
+def environment(breakfast_path: str, lunch_path: str, n_recipes: int) -> Dict:
+    import pandas as pd
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'breakfast_csv': os.path.basename(breakfast_path),
+        'lunch_csv': os.path.basename(lunch_path),
+        'recipes': n_recipes,
+    }
+
+
+def run_benchmarks(breakfast_path: str, lunch_path: str, repeat: int = 20,
+                   only: Optional[List[str]] = None) -> Dict:
+    # flaskapi reads its data paths from the environment at import time
+    os.environ['BREAKFAST_PATH'] = breakfast_path
+    os.environ['LUNCH_PATH'] = lunch_path
+    os.environ.pop('PLANNER_ARTIFACT_DIR', None)
+    import flaskapi
+    from flaskapi import DietaryPreferences, MealPlanner, PlanRequest
+
+    def wanted(name: str) -> bool:
+        return only is None or name in only
+
+    results = []
+
+    def record(name: str, fn: Callable[[], object], runs: int, items: int = 1, warmup: int = 1):
+        if wanted(name):
+            print(f"  {name} ...", file=sys.stderr)
+            results.append(summarize(name, measure(fn, runs, warmup), items))
+
+    print("Running planner benchmarks", file=sys.stderr)
+    construction_runs = max(1, min(repeat, 3))
+    record('planner_construction', lambda: MealPlanner(breakfast_path, lunch_path),
+           construction_runs, warmup=0)
+
+    planner = MealPlanner(breakfast_path, lunch_path)
+    if wanted('planner_from_artifacts'):
+        artifact_root = tempfile.mkdtemp(prefix='mealplanner-bench-')
+        try:
+            planner.save_artifacts(artifact_root)
+            record('planner_from_artifacts',
+                   lambda: MealPlanner.from_artifacts(artifact_root, breakfast_path, lunch_path),
+                   construction_runs, warmup=0)
+        finally:
+            shutil.rmtree(artifact_root, ignore_errors=True)
+
+    n_masks = 1 << len(planner.dietary_columns)
+    all_preferences = [DietaryPreferences.from_bitmask(mask) for mask in range(n_masks)]
+
+    def filter_all_masks():
+        planner._preference_index.clear()
+        for preferences in all_preferences:
+            try:
+                planner._filter_by_preferences(preferences)
+            except ValueError:
+                pass
+
+    def candidate_pools_cold():
+        planner._preference_index.clear()
+        planner._candidate_pool_index.clear()
+        for preferences in all_preferences:
+            try:
+                planner._candidate_pools(preferences)
+            except ValueError:
+                pass
+
+    def kmeans_clusters_cold():
+        planner._clusters = None
+        planner._recipe_clusters()
+
+    record('filter_all_masks', filter_all_masks, repeat, items=n_masks)
+    record('candidate_pools_cold', candidate_pools_cold, repeat, items=n_masks)
+    record('kmeans_clusters_cold', kmeans_clusters_cold, repeat, items=len(planner.store))
+    fallback_preferences = DietaryPreferences(vegetarian=True, low_sodium=True)
+    record('fallback_scoring', lambda: planner._score_preference_fallback(fallback_preferences, 50), repeat)
+    planner.precompute_candidate_pools()
+
+    preferences = DietaryPreferences()
+    record('weekly_plan', lambda: planner.generate_weekly_plan(2000, preferences), repeat * 10, items=7)
+    if wanted('weekly_plan_optimize'):
+        optimizer = MealPlanner(breakfast_path, lunch_path, selection_mode='optimize')
+        record('weekly_plan_optimize', lambda: optimizer.generate_weekly_plan(2000, preferences),
+               repeat * 5, items=7)
+    if wanted('weekly_plan_week_solver'):
+        solver = MealPlanner(breakfast_path, lunch_path, week_solver_budget_ms=20.0)
+        record('weekly_plan_week_solver', lambda: solver.generate_weekly_plan(2000, preferences),
+               repeat, items=7)
+    record('horizon_84_days', lambda: list(planner.iter_plan_days(2000, preferences, 84)), repeat, items=84)
+
+    rng = np.random.default_rng(0)
+    for size in (100, 500):
+        roster = [PlanRequest(tdee=int(tdee), preferences=all_preferences[int(mask)])
+                  for tdee, mask in zip(rng.integers(1400, 3200, size), rng.integers(0, 32, size))]
+        record(f'batch_{size}', lambda roster=roster: planner.generate_weekly_plans_batch(roster),
+               repeat, items=size)
+
+    weekly_plan = planner.generate_weekly_plan(2000, preferences, seed=0)
+    record('replan_one_meal',
+           lambda: planner.replan_meals(weekly_plan, [('Wednesday', 'Dinner')], 2000, preferences),
+           repeat * 10)
+
+    if any(wanted(name) for name in ('request_predict', 'request_predict_cached', 'request_batch_100')):
+        flaskapi.planner_registry.warm_up()
+        client = flaskapi.app.test_client()
+        body = {'tdee': 2000, 'dietary_restrictions': ['vegetarian'], 'allergies': ['peanut']}
+        batch_body = {'requests': [dict(body, tdee=1500 + i * 10) for i in range(100)]}
+
+        def post(path: str, payload: Dict):
+            # The routes log every request body; keep that out of the benchmark output
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = client.post(path, json=payload)
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+        record('request_predict', lambda: post('/predict_meal_plan', body), repeat * 5, items=1)
+        record('request_predict_cached', lambda: post('/predict_meal_plan', dict(body, seed=7)),
+               repeat * 5, items=1)
+        record('request_batch_100', lambda: post('/predict_meal_plan/batch', batch_body), repeat, items=100)
+
+    return {'environment': environment(breakfast_path, lunch_path, len(planner.store)), 'results': results}
+
+
+def print_table(report: Dict, baseline: Optional[Dict] = None):
+    base = {r['name']: r for r in baseline['results']} if baseline else {}
+    header = f"{'case':<26}{'median ms':>12}{'p95 ms':>12}{'items/s':>14}"
+    print(header + (f"{'vs baseline':>14}" if base else ''))
+    for result in report['results']:
+        line = (f"{result['name']:<26}{result['median'] * 1000:>12.3f}{result['p95'] * 1000:>12.3f}"
+                f"{result['items_per_second'] or 0:>14.1f}")
+        if result['name'] in base:
+            ratio = result['median'] / base[result['name']]['median']
+            line += f"{ratio:>13.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the meal planner')
+    parser.add_argument('--breakfast', default=DEFAULT_BREAKFAST, help='Breakfast recipes CSV')
+    parser.add_argument('--lunch', default=DEFAULT_LUNCH, help='Lunch/dinner recipes CSV')
+    parser.add_argument('--synthetic', type=int, metavar='N',
+                        help='Benchmark a generated catalogue of N recipes instead of the CSVs')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the --synthetic catalogue')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per case (some cases scale this)')
+    parser.add_argument('--only', help='Comma-separated case names to run')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', help='Baseline JSON report to compare medians against')
+    args = parser.parse_args()
+
+    only = args.only.split(',') if args.only else None
+    if args.synthetic:
+        from synthetic_recipes import split_rows, write_catalogue
+        catalogue_dir = tempfile.mkdtemp(prefix='mealplanner-synthetic-')
+        try:
+            print(f"Generating {args.synthetic} synthetic recipes", file=sys.stderr)
+            breakfast_path, lunch_path = write_catalogue(catalogue_dir, *split_rows(args.synthetic),
+                                                         seed=args.seed)
+            report = run_benchmarks(breakfast_path, lunch_path, args.repeat, only)
+        finally:
+            shutil.rmtree(catalogue_dir, ignore_errors=True)
+        report['environment']['synthetic_seed'] = args.seed
+    else:
+        report = run_benchmarks(os.path.abspath(args.breakfast), os.path.abspath(args.lunch), args.repeat, only)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
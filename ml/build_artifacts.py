@@ -0,0 +1,32 @@
+"""
+Offline build step for the meal planner models.
+
+Trains the RandomForest, StandardScaler and KMeans used by flaskapi.MealPlanner
+and writes them, together with a fingerprint of the recipe CSVs, to a
+versioned directory that MealPlanner.from_artifacts() can load at startup:
+
+    python build_artifacts.py --output artifacts
+    PLANNER_ARTIFACT_DIR=artifacts python flaskapi.py
+"""
+import argparse
+
+from flaskapi import MealPlanner, BREAKFAST_PATH, LUNCH_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and persist meal planner models')
+    parser.add_argument('--breakfast', default=BREAKFAST_PATH, help='Breakfast recipes CSV')
+    parser.add_argument('--lunch', default=LUNCH_PATH, help='Lunch/dinner recipes CSV')
+    parser.add_argument('--output', default='artifacts', help='Artifact root directory')
+    args = parser.parse_args()
+
+    planner = MealPlanner(breakfast_path=args.breakfast, lunch_path=args.lunch)
+    artifact_dir = planner.save_artifacts(args.output)
+    print(f"Wrote model artifacts to {artifact_dir}")
+
+    # Round-trip to make sure the artifacts are loadable before shipping them
+    MealPlanner.from_artifacts(args.output, args.breakfast, args.lunch)
+
+
+if __name__ == '__main__':
+    main()
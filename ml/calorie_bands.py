@@ -0,0 +1,44 @@
+"""
+Random-forest calorie bands, predicted once per recipe when the models load.
+
+MealPlanner's RandomForestClassifier maps a recipe's calories to a 30-calorie
+range label ("300-330"). Predicting it per request, for every candidate row,
+was the most expensive step of a plan, so the bands are computed here in one
+batched predict and kept as small integer codes. Only code paths that need
+the bands (e.g. the preference fallback scoring) consult the service.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CalorieBandService:
+    """
+    Predicted calorie band per recipe position.
+
+    codes[i] indexes labels (the forest's classes_). With enabled=False the
+    forest is never queried and band lookups raise RuntimeError, so callers
+    must check enabled and skip band-based logic.
+    """
+
+    def __init__(self, rf_model, calories: pd.Series, enabled: bool = True):
+        self.enabled = enabled
+        self.labels = np.asarray(rf_model.classes_) if enabled else np.array([], dtype=object)
+        self.codes = None
+        if enabled:
+            # The forest was fitted on a 'calories' DataFrame column; keep the feature name
+            predictions = rf_model.predict(pd.DataFrame({'calories': np.asarray(calories)}))
+            # classes_ is sorted, so searchsorted gives each prediction's class index
+            self.codes = np.searchsorted(self.labels, predictions).astype(np.int16)
+            self.codes.flags.writeable = False
+
+    @property
+    def n_bands(self) -> int:
+        return len(self.labels)
+
+    def band_codes(self, positions: np.ndarray) -> np.ndarray:
+        if not self.enabled:
+            raise RuntimeError("Calorie bands are disabled for this planner")
+        return self.codes[positions]
+
+    def label(self, code: int) -> str:
+        return str(self.labels[code])
@@ -1,15 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from collections import defaultdict, deque
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 from sklearn.model_selection import train_test_split
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 import os
+import json
+import hashlib
+import hmac
+import threading
+import itertools
+import time
+import joblib
+import sklearn
 from datetime import datetime, timedelta
+from calorie_bands import CalorieBandService
+from json_provider import FastJSONProvider
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from tracing import NULL_TRACER, FileExporter, InMemoryExporter, Tracer
+from profiler import SamplingProfiler
+from meal_optimizer import optimize_day, optimize_meal
+from batch_sampler import PoolSampler
+from week_solver import servings_to_index, solve_week
+from plan_cache import PlanCache, InProcessBackend, RedisBackend, plan_cache_key
+from recipe_store import ALLOWED_SERVINGS, CandidatePool, RecipeStore, optimal_servings, plain_number, MIN_SERVINGS, MAX_SERVINGS
 
 # Helper functions for TDEE calculation
 def calculate_bmr(weight, height, age, gender):
@@ -33,20 +52,22 @@ def calculate_tdee(bmr, activity_level):
     """
     return bmr * activity_level
 
-def convert_numpy_types(obj):
-    """Convert numpy types to native Python types for JSON serialization"""
-    import numpy as np
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    else:
-        return obj
-
-# Initialize the Flask app
+# Initialize the Flask app; numpy values are encoded by its JSON provider
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+# Per-process metrics served at /metrics
+METRICS = MetricsRegistry()
+REQUEST_COUNT = METRICS.counter(
+    'mealplanner_requests_total', 'HTTP requests by endpoint and status code', ('endpoint', 'status'))
+REQUEST_ERRORS = METRICS.counter(
+    'mealplanner_request_errors_total',
+    'Failed plan requests (and failed batch items) by endpoint and error type', ('endpoint', 'error'))
+REQUEST_LATENCY = METRICS.histogram(
+    'mealplanner_request_duration_seconds',
+    'Time until the response is returned (streamed bodies excluded), by endpoint', ('endpoint',))
+STAGE_LATENCY = METRICS.histogram(
+    'mealplanner_stage_duration_seconds', 'Time spent in each stage of plan requests', ('stage',))
 # Enable CORS for all origins
 CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -69,8 +90,235 @@ class DietaryPreferences:
             self.shellfish_allergy, self.fish_allergy, self.halal_or_kosher
         ]], dtype=float)
 
+    def to_bitmask(self) -> int:
+        """Pack the preferences into an int; bit i matches MealPlanner.dietary_columns[i]."""
+        return sum(1 << i for i, flag in enumerate(self.to_array()[0]) if flag)
+
+    @classmethod
+    def from_bitmask(cls, mask: int) -> 'DietaryPreferences':
+        """Inverse of to_bitmask()."""
+        return cls(*(bool(mask >> i & 1) for i in range(len(fields(cls)))))
+
+# Meal-type categories are bit flags: a title listed in both CSVs is both
+MEAL_TYPE_BREAKFAST = 1
+MEAL_TYPE_LUNCH_DINNER = 2
+
+WEEK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MEAL_SLOTS = ('Breakfast', 'Lunch', 'Dinner')
+# The at-most-twice rule applies to any run of this many consecutive days
+VARIETY_WINDOW_DAYS = 7
+RICE_CALORIES = 600
+# Share of the rice-adjusted TDEE given to breakfast, lunch and dinner
+MEAL_SPLIT = (0.4, 0.3, 0.3)
+SELECTION_MODES = ('sample', 'optimize')
+
+
+@dataclass
+class PlanRequest:
+    """One user's input to MealPlanner.generate_weekly_plans_batch()."""
+    tdee: int
+    preferences: DietaryPreferences
+    seed: Optional[int] = None
+
+
+# Bump whenever the set of persisted models or their training changes
+ARTIFACT_VERSION = 1
+ARTIFACT_MODELS = ('rf_model', 'kmeans_model', 'scaler')
+
+
+class ArtifactMismatchError(ValueError):
+    """Raised when persisted model artifacts do not match the recipe CSVs."""
+
+
+class UnknownRecipeError(ValueError):
+    """Raised when a plan handed back for replanning keeps a recipe that is not in the catalogue."""
+
+
+def compute_data_fingerprint(*paths: str) -> str:
+    """SHA-256 over the raw bytes of the source CSVs, in the given order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_dir_for(artifact_root: str, fingerprint: str) -> str:
+    """Versioned directory holding the models trained on a given data fingerprint."""
+    return os.path.join(artifact_root, f"v{ARTIFACT_VERSION}-{fingerprint[:12]}")
+
+
 class MealPlanner:
-    def __init__(self, breakfast_path: str, lunch_path: str):
+    def __init__(self, breakfast_path: str, lunch_path: str, seed: Optional[int] = None,
+                 calorie_bands: bool = True, preference_fallback: bool = False,
+                 min_required_options: int = 10, calorie_margin: Optional[float] = None,
+                 selection_mode: str = 'sample', optimizer_budget_ms: float = 5.0,
+                 week_solver_budget_ms: Optional[float] = None, tracer: Optional[Tracer] = None,
+                 models: Optional[Tuple[RandomForestClassifier, KMeans, StandardScaler]] = None):
+        """
+        Load the recipe CSVs and train the models, or use already fitted
+        (rf_model, kmeans_model, scaler) models, as from_artifacts() does.
+        With calorie_bands=False the random forest is neither trained nor
+        loaded, and rf_model is None.
+        """
+        self.tracer = tracer or NULL_TRACER
+        self.preference_fallback = preference_fallback
+        self.week_solver_budget_ms = week_solver_budget_ms
+        self.min_required_options = min_required_options
+        self.calorie_margin = calorie_margin
+        self._set_selection_mode(selection_mode, optimizer_budget_ms)
+        self._init_rng(seed)
+        self._load_data(breakfast_path, lunch_path)
+        if models is None:
+            with self.tracer.span('train_models', recipes=len(self.data)):
+                models = self._train_models(fit_forest=calorie_bands)
+        self.rf_model, self.kmeans_model, self.scaler = models
+        self._init_calorie_bands(calorie_bands)
+        self.plan_signature = self._plan_signature()
+
+    @classmethod
+    def from_artifacts(cls, artifact_root: str, breakfast_path: str, lunch_path: str,
+                       mmap_mode: str = 'r', **options) -> 'MealPlanner':
+        """
+        Build a planner from models persisted by save_artifacts() instead of training.
+
+        The recipe CSVs are still read, and their fingerprint must match the one
+        recorded when the artifacts were built; otherwise ArtifactMismatchError
+        is raised and the artifacts need rebuilding with build_artifacts.py.
+        Model arrays are memory-mapped (mmap_mode='r') so workers share pages.
+        options are the MealPlanner constructor's keyword arguments.
+        """
+        fingerprint = compute_data_fingerprint(breakfast_path, lunch_path)
+        artifact_dir = artifact_dir_for(artifact_root, fingerprint)
+        manifest_path = os.path.join(artifact_dir, 'manifest.json')
+        rebuild_hint = (f"Rebuild them with: python build_artifacts.py --breakfast {breakfast_path} "
+                        f"--lunch {lunch_path} --output {artifact_root}")
+
+        if not os.path.exists(manifest_path):
+            available = sorted(os.listdir(artifact_root)) if os.path.isdir(artifact_root) else []
+            raise ArtifactMismatchError(
+                f"No v{ARTIFACT_VERSION} artifacts for data fingerprint {fingerprint[:12]} in "
+                f"{artifact_root} (found: {available or 'nothing'}). {rebuild_hint}"
+            )
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('artifact_version') != ARTIFACT_VERSION or manifest.get('data_fingerprint') != fingerprint:
+            raise ArtifactMismatchError(
+                f"Artifacts in {artifact_dir} were built for version {manifest.get('artifact_version')} / "
+                f"data {str(manifest.get('data_fingerprint'))[:12]}, expected version {ARTIFACT_VERSION} / "
+                f"data {fingerprint[:12]}. {rebuild_hint}"
+            )
+
+        # The forest is only needed (and may only have been saved) with calorie bands
+        needed = [name for name in ARTIFACT_MODELS
+                  if name != 'rf_model' or options.get('calorie_bands', True)]
+        missing = set(needed) - set(manifest.get('models', ARTIFACT_MODELS))
+        if missing:
+            raise ArtifactMismatchError(
+                f"Artifacts in {artifact_dir} lack {sorted(missing)} (saved without calorie bands?). {rebuild_hint}"
+            )
+
+        tracer = options.get('tracer') or NULL_TRACER
+        with tracer.span('load_artifacts', artifact_dir=artifact_dir):
+            models = tuple(
+                joblib.load(os.path.join(artifact_dir, f"{name}.joblib"), mmap_mode=mmap_mode)
+                if name in needed else None
+                for name in ARTIFACT_MODELS
+            )
+        return cls(breakfast_path, lunch_path, models=models, **options)
+
+    def save_artifacts(self, artifact_root: str) -> str:
+        """
+        Persist the fitted models plus a data fingerprint; returns the versioned
+        directory. A planner without calorie bands has no forest to save, and
+        the manifest lists the models that were saved.
+        """
+        fingerprint = compute_data_fingerprint(self.breakfast_path, self.lunch_path)
+        artifact_dir = artifact_dir_for(artifact_root, fingerprint)
+        os.makedirs(artifact_dir, exist_ok=True)
+
+        saved = [name for name in ARTIFACT_MODELS if getattr(self, name) is not None]
+        for name in saved:
+            joblib.dump(getattr(self, name), os.path.join(artifact_dir, f"{name}.joblib"))
+
+        # The manifest is written last so a half-written directory is never loadable
+        manifest = {
+            'artifact_version': ARTIFACT_VERSION,
+            'data_fingerprint': fingerprint,
+            'models': saved,
+            'sources': [os.path.basename(self.breakfast_path), os.path.basename(self.lunch_path)],
+            'sklearn_version': sklearn.__version__,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(os.path.join(artifact_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return artifact_dir
+
+    def _set_selection_mode(self, selection_mode: str, optimizer_budget_ms: float):
+        """
+        'sample' draws meals at random and rounds servings (the original behaviour);
+        'optimize' picks meals and servings jointly to hit the 40/30/30 calorie
+        split, spending at most about optimizer_budget_ms per day.
+        """
+        if selection_mode not in SELECTION_MODES:
+            raise ValueError(f"selection_mode must be one of {SELECTION_MODES}, got {selection_mode!r}")
+        self.selection_mode = selection_mode
+        self.optimizer_budget_ms = optimizer_budget_ms
+
+    def _init_rng(self, seed: Optional[int]):
+        """
+        Per-planner seed source. Requests without their own seed get a child
+        Generator spawned from it, so a seeded planner replays the same sequence
+        of plans and no request touches the global NumPy RNG.
+        """
+        self.seed = seed
+        self._seed_sequence = np.random.SeedSequence(seed)
+        self._seed_lock = threading.Lock()
+
+    def _make_rng(self, seed: Optional[int] = None) -> np.random.Generator:
+        """A private Generator: from the request seed when given, else spawned from the planner's."""
+        if seed is not None:
+            return np.random.default_rng(seed)
+        with self._seed_lock:
+            child = self._seed_sequence.spawn(1)[0]
+        return np.random.default_rng(child)
+
+    def _init_calorie_bands(self, enabled: bool):
+        """Predict every recipe's calorie band once; calorie_bands=False skips the forest entirely."""
+        self.calorie_bands = CalorieBandService(self.rf_model, self.data['calories'], enabled=enabled)
+        if enabled:
+            self.data['calorie_band'] = self.calorie_bands.codes
+
+    def _plan_signature(self) -> str:
+        """
+        Short digest of everything besides the request that shapes a seeded
+        plan: the recipe data and the plan-affecting options. The fallback's
+        clusters and calorie bands count too when preference_fallback is on,
+        since models trained at startup differ between processes. Equal
+        signatures across processes and deploys mean equal plans, so shared
+        caches key on it.
+        """
+        digest = hashlib.sha256(json.dumps({
+            'data_fingerprint': self.data_fingerprint,
+            'selection_mode': self.selection_mode,
+            'optimizer_budget_ms': self.optimizer_budget_ms,
+            'week_solver_budget_ms': self.week_solver_budget_ms,
+            'calorie_margin': self.calorie_margin,
+            'preference_fallback': self.preference_fallback,
+            'min_required_options': self.min_required_options,
+        }, sort_keys=True).encode())
+        if self.preference_fallback:
+            digest.update(self._recipe_clusters().tobytes())
+            if self.calorie_bands.enabled:
+                digest.update(self.calorie_bands.codes.tobytes())
+        return digest.hexdigest()[:16]
+
+    def _load_data(self, breakfast_path: str, lunch_path: str):
+        self.breakfast_path = breakfast_path
+        self.lunch_path = lunch_path
+        self.data_fingerprint = compute_data_fingerprint(breakfast_path, lunch_path)
         self.breakfast_data = pd.read_csv(breakfast_path)
         self.lunch_data = pd.read_csv(lunch_path)
         self.data = pd.concat([self.breakfast_data, self.lunch_data], ignore_index=True)
@@ -79,21 +327,49 @@ class MealPlanner:
             'Low-Sodium', 'Lactose-free', 'Peanut Allergy', 
             'Shellfish Allergy', 'Fish Allergy', 'Halal or Kosher'
         ]
-        
-        self.rf_model, self.kmeans_model, self.scaler = self._train_models()
 
-    def _train_models(self) -> Tuple[RandomForestClassifier, KMeans, StandardScaler]:
         # Prepare data
         self.data['calorie_range'] = self._create_calorie_ranges(self.data['calories'])
-        self.data = self.data.dropna(subset=['calories', 'calorie_range'])
+        self.data = self.data.dropna(subset=['calories', 'calorie_range']).reset_index(drop=True)
 
-        # Train Random Forest
-        X = self.data[['calories']]
-        y = self.data['calorie_range']
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
-        
-        rf = RandomForestClassifier(n_estimators=50)
-        rf.fit(X_train, y_train)
+        self._build_meal_type_index()
+        self._build_preference_index()
+        self.store = RecipeStore.from_frame(self.data, self.dietary_bitmask, self.meal_type)
+
+    def _build_meal_type_index(self):
+        """Tag each recipe with its meal-type category once, instead of title lookups per request."""
+        titles = self.data['title']
+        self.meal_type = (
+            titles.isin(self.breakfast_data['title']).to_numpy() * MEAL_TYPE_BREAKFAST
+            | titles.isin(self.lunch_data['title']).to_numpy() * MEAL_TYPE_LUNCH_DINNER
+        ).astype(np.uint8)
+        self.meal_type.flags.writeable = False
+
+    def _build_preference_index(self):
+        """Pack the dietary flag columns into one integer bitmask per recipe."""
+        flags = self.data[self.dietary_columns].fillna(False).to_numpy(dtype=bool)
+        bits = 1 << np.arange(len(self.dietary_columns), dtype=np.uint16)
+        self.dietary_bitmask = (flags * bits).sum(axis=1).astype(np.uint16)
+        self.dietary_bitmask.flags.writeable = False
+
+        # Allergy and halal/kosher flags are critical restrictions, the rest are preferences
+        self.hard_constraint_mask = sum(
+            int(bit) for bit, column in zip(bits, self.dietary_columns)
+            if any(x in column.lower() for x in ['allergy', 'halal', 'kosher'])
+        )
+        self._preference_index = {}
+        self._candidate_pool_index = {}
+
+    def _train_models(self, fit_forest: bool = True) -> Tuple[Optional[RandomForestClassifier], KMeans, StandardScaler]:
+        # Train Random Forest (only used for calorie bands)
+        rf = None
+        if fit_forest:
+            X = self.data[['calories']]
+            y = self.data['calorie_range']
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
+
+            rf = RandomForestClassifier(n_estimators=50)
+            rf.fit(X_train, y_train)
 
         # Train K-means
         features = self.data[self.dietary_columns].values
@@ -111,215 +387,612 @@ class MealPlanner:
         labels = [f"{bins[i]}-{bins[i+1]}" for i in range(len(bins)-1)]
         return pd.cut(calories, bins=bins, labels=labels)
 
-    def generate_weekly_plan(self, tdee: int, preferences: DietaryPreferences) -> Dict:
-        filtered_data = self._filter_by_preferences(preferences)
-        weekly_plan = {}
-        
-        # Use dictionaries to track meal usage counts
-        breakfast_meal_counts = {}
-        lunch_dinner_meal_counts = {}
-        
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    def generate_weekly_plan(self, tdee: int, preferences: DietaryPreferences,
+                             seed: Optional[int] = None) -> Dict:
+        """Weekly plan keyed by day name; the same seed always gives the same plan."""
+        with self.tracer.span('generate_weekly_plan', tdee=tdee, pref_mask=preferences.to_bitmask(),
+                              seeded=seed is not None):
+            return self._generate_week(self._candidate_pools(preferences), tdee, self._make_rng(seed))
+
+    def iter_plan_days(self, tdee: int, preferences: DietaryPreferences, days: int,
+                       seed: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Daily records for a horizon of any length, yielded as they are generated.
+
+        Preferences are filtered once for the whole horizon and no meal is used
+        more than twice in any VARIETY_WINDOW_DAYS consecutive days, so 4- or
+        12-week plans keep their variety across week boundaries. The first
+        seven days equal generate_weekly_plan() for the same seed.
+        """
+        return self._iter_days(self._candidate_pools(preferences), tdee, days, self._make_rng(seed))
+
+    def _generate_week(self, candidate_pools: Dict[int, CandidatePool], tdee: int,
+                       rng: np.random.Generator) -> Dict:
+        return dict(zip(WEEK_DAYS, self._iter_days(candidate_pools, tdee, len(WEEK_DAYS), rng)))
+
+    def _iter_days(self, candidate_pools: Dict[int, CandidatePool], tdee: int, n_days: int,
+                   rng: np.random.Generator) -> Iterator[Dict]:
+        """
+        Greedy day-by-day generation over a rolling variety window, in chunks
+        of a week. With week_solver_budget_ms set, each chunk is refined as a
+        whole by the week solver (greedy week as warm start) before it is
+        yielded, counting the previous week's meals toward its repeat limit.
+        """
+        # Track meal usage counts per title (indexed by RecipeStore.title_id)
+        # over the last VARIETY_WINDOW_DAYS days; the day generator updates them in place
+        breakfast_meal_counts = np.zeros(self.store.n_titles, dtype=np.int32)
+        lunch_dinner_meal_counts = np.zeros(self.store.n_titles, dtype=np.int32)
+        window = deque()
         
-        for day in days:
-            daily_meals = self._generate_daily_meals_with_variety(
-                filtered_data, tdee, breakfast_meal_counts, lunch_dinner_meal_counts
+        for chunk_start in range(0, n_days, len(WEEK_DAYS)):
+            chunk_days = min(len(WEEK_DAYS), n_days - chunk_start)
+            prior_counts = (breakfast_meal_counts.copy(), lunch_dinner_meal_counts.copy())
+            week_meals, week_servings = [], []
+            for day in range(chunk_start, chunk_start + chunk_days):
+                if len(window) == VARIETY_WINDOW_DAYS:
+                    self._release_day(window.popleft(), breakfast_meal_counts, lunch_dinner_meal_counts)
+                with STAGE_LATENCY.time(stage='generate_day'), self.tracer.span('generate_day', day=day):
+                    meals, servings = self._select_daily_meals(
+                        candidate_pools, tdee, breakfast_meal_counts, lunch_dinner_meal_counts, rng
+                    )
+                window.append(meals)
+                week_meals.append(meals)
+                week_servings.append(servings)
+
+            if self.week_solver_budget_ms:
+                adjusted_tdee = tdee - RICE_CALORIES
+                with STAGE_LATENCY.time(stage='week_solver'), \
+                        self.tracer.span('week_solver', days=chunk_days, budget_ms=self.week_solver_budget_ms):
+                    solved_meals, solved_servings = solve_week(
+                        self.store,
+                        candidate_pools[MEAL_TYPE_BREAKFAST].positions,
+                        candidate_pools[MEAL_TYPE_LUNCH_DINNER].positions,
+                        [int(adjusted_tdee * share) for share in MEAL_SPLIT], adjusted_tdee,
+                        np.array(week_meals), servings_to_index(np.array(week_servings)), rng,
+                        budget_ms=self.week_solver_budget_ms,
+                        prior_counts=prior_counts if chunk_start else None,
+                    )
+                # The chunk's days are the newest in the window; swap in the solved meals
+                for greedy, solved in zip(week_meals, solved_meals):
+                    self._release_day(greedy, breakfast_meal_counts, lunch_dinner_meal_counts)
+                    self._count_day(solved, breakfast_meal_counts, lunch_dinner_meal_counts)
+                for _ in range(chunk_days):
+                    window.pop()
+                window.extend(solved_meals)
+                week_meals, week_servings = solved_meals, ALLOWED_SERVINGS[solved_servings]
+
+            for meals, servings in zip(week_meals, week_servings):
+                yield self._daily_record(meals, servings)
+
+    def _count_day(self, meals: np.ndarray, breakfast_meal_counts: np.ndarray,
+                   lunch_dinner_meal_counts: np.ndarray, step: int = 1):
+        """Add (or with step=-1 remove) one day's meals to the per-title usage counters."""
+        title_id = self.store.title_id
+        breakfast_meal_counts[title_id[meals[0]]] += step
+        lunch_dinner_meal_counts[title_id[meals[1]]] += step
+        lunch_dinner_meal_counts[title_id[meals[2]]] += step
+
+    def _release_day(self, meals: np.ndarray, breakfast_meal_counts: np.ndarray,
+                     lunch_dinner_meal_counts: np.ndarray):
+        self._count_day(meals, breakfast_meal_counts, lunch_dinner_meal_counts, step=-1)
+
+    def replan_meals(self, weekly_plan: Dict, slots, tdee: int, preferences: DietaryPreferences,
+                     seed: Optional[int] = None) -> Dict:
+        """
+        Copy of weekly_plan with only the given (day, meal) slots regenerated.
+
+        weekly_plan has the generate_weekly_plan() shape; meal is one of
+        MEAL_SLOTS. Usage counters are rebuilt from the kept meals, so the
+        usual at-most-twice and lunch != dinner rules hold against the rest
+        of the week, and a replaced slot never gets its old recipe back when
+        any alternative exists. Servings aim at what the day still needs
+        after its kept meals. Days without replaced slots are returned as is.
+        A kept meal that is not in the catalogue raises UnknownRecipeError.
+        """
+        store = self.store
+        replace = defaultdict(set)
+        for day, meal in slots:
+            if day not in weekly_plan or meal not in MEAL_SLOTS:
+                raise ValueError(f"Cannot replan {meal!r} on {day!r}: not a meal in this plan")
+            replace[day].add(MEAL_SLOTS.index(meal))
+
+        candidate_pools = self._candidate_pools(preferences)
+        if any(pool.size == 0 for pool in candidate_pools.values()):
+            raise ValueError("Not enough meal options available for your preferences")
+        rng = self._make_rng(seed)
+        adjusted_tdee = tdee - RICE_CALORIES
+
+        # Positions and servings of the current plan; kept meals must be known recipes
+        week_meals, week_servings, rejected = {}, {}, {}
+        breakfast_meal_counts = np.zeros(store.n_titles, dtype=np.int32)
+        lunch_dinner_meal_counts = np.zeros(store.n_titles, dtype=np.int32)
+        for day, day_plan in weekly_plan.items():
+            meals = np.full(3, -1, dtype=np.int64)
+            servings = np.zeros(3)
+            for i, meal in enumerate(MEAL_SLOTS):
+                record = day_plan[meal]
+                try:
+                    position = store.position_for_title(record['title'], record.get('calories'))
+                except KeyError:
+                    if i in replace[day]:
+                        continue
+                    raise UnknownRecipeError(f"Unknown recipe in plan: {record['title']!r}")
+                if i in replace[day]:
+                    rejected[day, i] = store.title_id[position]
+                    continue
+                meals[i], servings[i] = position, float(record['servings'])
+                counts = breakfast_meal_counts if i == 0 else lunch_dinner_meal_counts
+                counts[store.title_id[position]] += 1
+            week_meals[day], week_servings[day] = meals, servings
+
+        new_plan = dict(weekly_plan)
+        for day, open_slots in replace.items():
+            meals, servings = week_meals[day], week_servings[day]
+            kept = meals >= 0
+            remaining = max(adjusted_tdee - float(store.calories[meals[kept]] @ servings[kept]), 0.0)
+            remaining_share = sum(MEAL_SPLIT[i] for i in open_slots)
+
+            for i in sorted(open_slots):
+                target = remaining * MEAL_SPLIT[i] / remaining_share
+                category = MEAL_TYPE_BREAKFAST if i == 0 else MEAL_TYPE_LUNCH_DINNER
+                counts = breakfast_meal_counts if i == 0 else lunch_dinner_meal_counts
+                # Never hand back the rejected recipe, nor lunch == dinner, when avoidable
+                excluded = [rejected[day, i]] if (day, i) in rejected else []
+                if i > 0:
+                    excluded += [store.title_id[m] for m in meals[1:] if m >= 0]
+
+                options = candidate_pools[category].positions
+                if self.calorie_margin is not None:
+                    options = self._calorie_window(candidate_pools[category], target, 1, counts, excluded)
+                allowed = ~np.isin(store.title_id[options], excluded)
+                fresh = allowed & (counts[store.title_id[options]] < 2)
+                if fresh.any():
+                    options = options[fresh]
+                elif allowed.any():
+                    options = options[allowed]
+
+                if self.selection_mode == 'optimize':
+                    meals[i], servings[i] = optimize_meal(store, options, target, rng)
+                else:
+                    meals[i] = rng.choice(options)
+                    servings[i] = optimal_servings(store.calories[meals[i]], target)
+                counts[store.title_id[meals[i]]] += 1
+                remaining = max(remaining - store.calories[meals[i]] * servings[i], 0.0)
+                remaining_share -= MEAL_SPLIT[i]
+
+            new_plan[day] = self._daily_record(meals, servings)
+        return new_plan
+
+    def generate_weekly_plans_batch(
+        self, requests: List[PlanRequest], chunk_size: int = 512
+    ) -> List[Union[Dict, ValueError]]:
+        """
+        Weekly plans for many users at once, returned in request order.
+
+        Requests are grouped by preference bitmask so each group filters once
+        and shares its candidate pools; all users in a group then draw their
+        meals together with vectorized sampling (chunk_size bounds the users
+        per draw; see batch_sampler.py), under the same variety rules as
+        generate_weekly_plan. A group whose preferences leave no meals yields
+        its ValueError in place of a plan.
+
+        Requests with a seed, and every request when the planner runs in
+        'optimize' selection mode or with the week solver, are instead planned
+        one by one exactly as generate_weekly_plan would (still sharing the
+        group's filtered pools). A seeded request therefore gets the same plan
+        as generate_weekly_plan for that seed, whatever else is in the batch.
+        """
+        results: List[Union[Dict, ValueError]] = [None] * len(requests)
+        groups = defaultdict(list)
+        for i, plan_request in enumerate(requests):
+            groups[plan_request.preferences.to_bitmask()].append(i)
+
+        for indices in groups.values():
+            try:
+                candidate_pools = self._candidate_pools(requests[indices[0]].preferences)
+            except ValueError as e:
+                for i in indices:
+                    results[i] = e
+                continue
+
+            one_by_one = self.selection_mode == 'optimize' or bool(self.week_solver_budget_ms)
+            sampled = []
+            for i in indices:
+                if one_by_one or requests[i].seed is not None:
+                    results[i] = self._generate_week(candidate_pools, requests[i].tdee,
+                                                     self._make_rng(requests[i].seed))
+                else:
+                    sampled.append(i)
+
+            for start in range(0, len(sampled), chunk_size):
+                chunk = sampled[start:start + chunk_size]
+                tdees = np.array([requests[i].tdee for i in chunk], dtype=np.float64)
+                try:
+                    with STAGE_LATENCY.time(stage='generate_week_batch'):
+                        plans = self._generate_weekly_plans_vectorized(candidate_pools, tdees, self._make_rng())
+                except ValueError as e:
+                    plans = [e] * len(chunk)
+                for i, plan in zip(chunk, plans):
+                    results[i] = plan
+
+        return results
+
+    def _generate_weekly_plans_vectorized(
+        self, candidate_pools: Dict[int, CandidatePool], tdees: np.ndarray, rng: np.random.Generator
+    ) -> List[Dict]:
+        """
+        Batched counterpart of the generate_weekly_plan day loop for users sharing candidate pools.
+
+        Meals are drawn for all users at once by PoolSampler, whose work per
+        draw grows with the number of users rather than the pool size.
+        """
+        store = self.store
+        breakfast_pool = candidate_pools[MEAL_TYPE_BREAKFAST]
+        lunch_dinner_pool = candidate_pools[MEAL_TYPE_LUNCH_DINNER]
+        if breakfast_pool.size == 0 or lunch_dinner_pool.size == 0:
+            raise ValueError("Not enough meal options available for your preferences")
+
+        n_users = len(tdees)
+        users = np.arange(n_users)
+        adjusted_tdee = tdees - RICE_CALORIES
+        targets = (adjusted_tdee[:, None] * np.array(MEAL_SPLIT)).astype(int)
+
+        # Lunch and dinner are both drawn from the window around the lunch target
+        breakfast = PoolSampler(breakfast_pool, store.title_id[breakfast_pool.positions], targets[:, 0],
+                                self.calorie_margin, 1, len(WEEK_DAYS), rng)
+        lunch_dinner = PoolSampler(lunch_dinner_pool, store.title_id[lunch_dinner_pool.positions], targets[:, 1],
+                                   self.calorie_margin, 2, 2 * len(WEEK_DAYS), rng)
+
+        plans = [{} for _ in range(n_users)]
+        for day in WEEK_DAYS:
+            # Avoid meals already used twice (widening calorie windows to find
+            # others) unless the whole pool leaves nothing (breakfast) or fewer
+            # than two options (lunch/dinner); dinner differs from lunch unless
+            # the pool has no other title
+            breakfast_idx = breakfast.draw()
+            lunch_idx = lunch_dinner.draw()
+            dinner_idx = lunch_dinner.draw(avoid=lunch_dinner.titles[lunch_idx])
+
+            meals = np.stack([
+                breakfast_pool.positions[breakfast_idx],
+                lunch_dinner_pool.positions[lunch_idx],
+                lunch_dinner_pool.positions[dinner_idx],
+            ], axis=1)
+            calories = store.calories[meals]
+            servings = optimal_servings(calories, targets)
+
+            # Nudge the largest meal by half a serving when the day is >15% off target
+            meal_calories = calories * servings
+            total_calories = meal_calories.sum(axis=1)
+            off_target = np.abs(total_calories - adjusted_tdee) > adjusted_tdee * 0.15
+            largest = meal_calories.argmax(axis=1)
+            step = np.where(total_calories > adjusted_tdee, -0.5, 0.5)
+            servings[users, largest] = np.where(
+                off_target,
+                np.clip(servings[users, largest] + step, MIN_SERVINGS, MAX_SERVINGS),
+                servings[users, largest],
             )
-            
-            # Update usage counters
-            breakfast_title = daily_meals['Breakfast']['title']
-            lunch_title = daily_meals['Lunch']['title']
-            dinner_title = daily_meals['Dinner']['title']
-            
-            breakfast_meal_counts[breakfast_title] = breakfast_meal_counts.get(breakfast_title, 0) + 1
-            lunch_dinner_meal_counts[lunch_title] = lunch_dinner_meal_counts.get(lunch_title, 0) + 1
-            lunch_dinner_meal_counts[dinner_title] = lunch_dinner_meal_counts.get(dinner_title, 0) + 1
-            
-            weekly_plan[day] = daily_meals
 
-        return weekly_plan
+            breakfast.add(breakfast_idx)
+            lunch_dinner.add(lunch_idx)
+            lunch_dinner.add(dinner_idx)
 
-    def _filter_by_preferences(self, preferences: DietaryPreferences) -> pd.DataFrame:
-        # Start with all data
-        filtered_data = self.data.copy()
-        pref_array = preferences.to_array()[0]
-        
-        for i, column in enumerate(self.dietary_columns):
-            if pref_array[i] and any(x in column.lower() for x in ['allergy', 'halal', 'kosher']):
-                filtered_data = filtered_data[filtered_data[column] == True]
-        
-        # Step 1: Use Random Forest to select meals within appropriate calorie ranges
-        target_prediction_counts = {}
-        
-        # Get calorie range distribution from RandomForest predictions
-        for meal_type in ['breakfast', 'lunch/dinner']:
-            if meal_type == 'breakfast':
-                meal_data = filtered_data[filtered_data['title'].isin(self.breakfast_data['title'])]
-            else:
-                meal_data = filtered_data[filtered_data['title'].isin(self.lunch_data['title'])]
-                
-            if not meal_data.empty:
-                # Use DataFrame with proper column names for prediction
-                calories_df = pd.DataFrame({'calories': meal_data['calories']})
-                predictions = self.rf_model.predict(calories_df)
-                unique_predictions, counts = np.unique(predictions, return_counts=True)
-                target_prediction_counts[meal_type] = dict(zip(unique_predictions, counts))
-        
-        preference_constraints = ['Vegetarian', 'Low-Purine', 'Low-fat/Heart-Healthy', 
-                        'Low-Sodium', 'Lactose-free']
-        
-        # Try direct filtering with preferences
-        temp_data = filtered_data.copy()
-        
-        for i, column in enumerate(self.dietary_columns):
-            if pref_array[i] and column in preference_constraints:
-                temp_data = temp_data[temp_data[column] == True]
-        
-        # Always use the strictly filtered data
-        filtered_data = temp_data
-        
-        # Final safety check
-        if filtered_data.empty:
-            raise ValueError("Cannot find any meals matching your strict dietary requirements")
+            for user in range(n_users):
+                plans[user][day] = self._daily_record(meals[user], servings[user])
+
+        return plans
+
+    def _filter_by_preferences(self, preferences: DietaryPreferences) -> np.ndarray:
+        """
+        Row positions in self.data of the recipes satisfying every requested flag.
+
+        With preference_fallback enabled, a preference set leaving fewer than
+        min_required_options recipes for a meal type is topped up with the
+        best-scoring recipes of that type that still pass the critical
+        allergy/halal restrictions.
+        """
+        pref_mask = preferences.to_bitmask()
+
+        with self.tracer.span('filter_by_preferences', pref_mask=pref_mask) as span:
+            # Use the strictly filtered data: one mask test against the packed flags
+            positions = self._preference_positions(pref_mask)
+            if self.preference_fallback and self._meal_type_counts(positions).min() < self.min_required_options:
+                span.set_attribute('fallback', True)
+                positions = self._score_preference_fallback(preferences, self.min_required_options * 2)
+            span.set_attribute('matches', int(positions.size))
             
-        return filtered_data
-
-    def _generate_daily_meals_with_variety(
-        self, filtered_data: pd.DataFrame, tdee: int, 
-        breakfast_meal_counts: dict, lunch_dinner_meal_counts: dict
-    ) -> Dict:
-        """Generate daily meals with variety within a day and minimizing repetition across the week."""
-        rice_calories = 600  # Rice calories
-        adjusted_tdee = tdee - rice_calories  # Account for rice
+            # Final safety check
+            if positions.size == 0:
+                raise ValueError("Cannot find any meals matching your strict dietary requirements")
+                
+            return positions
+
+    def _meal_type_counts(self, positions: np.ndarray) -> np.ndarray:
+        """How many of positions are breakfast and lunch/dinner recipes."""
+        meal_type = self.meal_type[positions]
+        return np.array([np.count_nonzero(meal_type & category)
+                         for category in (MEAL_TYPE_BREAKFAST, MEAL_TYPE_LUNCH_DINNER)])
+
+    def _score_preference_fallback(self, preferences: DietaryPreferences, top_k: int) -> np.ndarray:
+        """
+        The strict matches plus, per meal type, the best-scoring other
+        candidates up to top_k recipes of that type; in position order.
+
+        Candidates are the recipes passing the critical restrictions. Each gets
+        5 points for sharing the user's preference cluster, plus up to 3 points
+        for how common its predicted calorie band is among candidates of the
+        meal type being topped up (skipped when calorie bands are disabled).
+        Each meal type is topped up separately, so the strict matches are never
+        dropped and lunch/dinner recipes never crowd out breakfasts. Everything
+        is array arithmetic over precomputed clusters and bands.
+        """
+        strict = self._preference_positions(preferences.to_bitmask())
+        candidates = self._preference_positions(preferences.to_bitmask() & self.hard_constraint_mask)
+        extra = np.setdiff1d(candidates, strict, assume_unique=True)
+        candidate_types = self.meal_type[candidates]
+        extra_types = self.meal_type[extra]
+        strict_counts = self._meal_type_counts(strict)
+        user_cluster = None
+
+        selected = [strict]
+        for category, strict_count in zip((MEAL_TYPE_BREAKFAST, MEAL_TYPE_LUNCH_DINNER), strict_counts):
+            needed = top_k - strict_count
+            options = extra[(extra_types & category) != 0]
+            if needed <= 0 or options.size == 0:
+                continue
+            if options.size > needed:
+                if user_cluster is None:
+                    user_cluster = self.kmeans_model.predict(self.scaler.transform(preferences.to_array()))[0]
+                scores = np.where(self._recipe_clusters()[options] == user_cluster, 5.0, 0.0)
+                if self.calorie_bands.enabled:
+                    in_category = candidates[(candidate_types & category) != 0]
+                    popularity = np.bincount(self.calorie_bands.band_codes(in_category),
+                                             minlength=self.calorie_bands.n_bands)
+                    scores += np.minimum(popularity[self.calorie_bands.band_codes(options)] / 10, 3)
+                options = options[np.argpartition(-scores, needed - 1)[:needed]]
+            selected.append(options)
+        return np.unique(np.concatenate(selected))
+
+    def _recipe_clusters(self) -> np.ndarray:
+        """K-means cluster of every recipe's dietary flags, predicted in one batch and cached."""
+        clusters = getattr(self, '_clusters', None)
+        if clusters is None:
+            features = self.scaler.transform(self.data[self.dietary_columns].to_numpy(dtype=float))
+            clusters = self.kmeans_model.predict(features)
+            clusters.flags.writeable = False
+            self._clusters = clusters
+        return clusters
+
+    def _preference_positions(self, pref_mask: int) -> np.ndarray:
+        """
+        Cached, read-only positions of the recipes whose bitmask contains pref_mask.
+
+        There are only 2 ** len(dietary_columns) distinct masks, so each one is
+        resolved with a single vectorized test the first time it is requested.
+        """
+        positions = self._preference_index.get(pref_mask)
+        if positions is None:
+            positions = np.flatnonzero((self.dietary_bitmask & pref_mask) == pref_mask)
+            positions.flags.writeable = False
+            # dict assignment is atomic; a racing thread at worst computes the same array
+            self._preference_index[pref_mask] = positions
+        return positions
+
+    def precompute_candidate_pools(self, masks=None) -> int:
+        """
+        Build the candidate pools for the given preference bitmasks (all of
+        them by default) ahead of traffic; returns how many were built.
+        Masks no recipe satisfies are skipped; requests for them still get
+        their usual error.
+
+        Called before forking workers so the pools live in memory every worker
+        shares, instead of each worker building its own copies on demand.
+        """
+        if masks is None:
+            masks = range(1 << len(self.dietary_columns))
+        built = 0
+        for mask in masks:
+            try:
+                self._candidate_pools(DietaryPreferences.from_bitmask(mask))
+            except ValueError:
+                continue
+            built += 1
+        return built
+
+    def warm_up(self):
+        """
+        Run every plan code path once on throwaway requests, so one-off costs
+        (lazy caches, first-call numpy/pandas setup, page faults on mapped
+        models) are paid before the first real request. Uses fixed seeds, so
+        the planner's own seed sequence is left untouched.
+        """
+        preferences = DietaryPreferences()
+        if self.preference_fallback:
+            self._recipe_clusters()
+        weekly_plan = self.generate_weekly_plan(2000, preferences, seed=0)
+        list(self.iter_plan_days(2000, preferences, 2 * len(WEEK_DAYS), seed=0))
+        self.generate_weekly_plans_batch([PlanRequest(tdee=2000, preferences=preferences, seed=0),
+                                          PlanRequest(tdee=1800, preferences=preferences, seed=1)])
+        self.replan_meals(weekly_plan, [(WEEK_DAYS[0], 'Lunch')], 2000, preferences, seed=0)
+
+    def after_fork(self):
+        """
+        Reset per-process state in a freshly forked worker. Without a planner
+        seed every worker gets its own entropy; otherwise all workers would
+        spawn the same child generators and serve identical "random" plans.
+        """
+        if self.seed is None:
+            self._init_rng(None)
+        else:
+            self._seed_lock = threading.Lock()
+
+    def _candidate_pools(self, preferences: DietaryPreferences) -> Dict[int, CandidatePool]:
+        """Calorie-sorted pools of the recipes allowed for each meal type, keyed by MEAL_TYPE_* category."""
+        pref_mask = preferences.to_bitmask()
+        pools = self._candidate_pool_index.get(pref_mask)
+        if pools is None:
+            with STAGE_LATENCY.time(stage='filter_preferences'):
+                positions = self._filter_by_preferences(preferences)
+            pools = {}
+            for category in (MEAL_TYPE_BREAKFAST, MEAL_TYPE_LUNCH_DINNER):
+                pools[category] = CandidatePool(positions[(self.meal_type[positions] & category) != 0], self.store)
+            self._candidate_pool_index[pref_mask] = pools
+        return pools
+
+    def _select_daily_meals(
+        self, candidate_pools: Dict[int, CandidatePool], tdee: int,
+        breakfast_meal_counts: np.ndarray, lunch_dinner_meal_counts: np.ndarray,
+        rng: Optional[np.random.Generator] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Breakfast/lunch/dinner positions and servings for one day, with variety
+        within the day and minimal repetition across the week.
+
+        The per-title usage counters are updated in place with the meals chosen
+        for the day. All sampling goes through rng (a fresh planner-spawned
+        Generator when omitted).
+        """
+        store = self.store
+        rng = rng if rng is not None else self._make_rng()
+        adjusted_tdee = tdee - RICE_CALORIES  # Account for rice
         
-        breakfast_target = int(adjusted_tdee * 0.4)
-        lunch_target = int(adjusted_tdee * 0.3)
-        dinner_target = int(adjusted_tdee * 0.3)
+        breakfast_target, lunch_target, dinner_target = (int(adjusted_tdee * share) for share in MEAL_SPLIT)
         
-        # Create masks for breakfast and lunch datasets
-        breakfast_mask = filtered_data['title'].isin(self.breakfast_data['title'])
-        lunch_mask = filtered_data['title'].isin(self.lunch_data['title'])
-
-        # Filter options
-        breakfast_options = filtered_data[breakfast_mask]
-        lunch_dinner_options = filtered_data[lunch_mask]
+        # Look up the pre-partitioned breakfast and lunch/dinner options
+        breakfast_pool = candidate_pools[MEAL_TYPE_BREAKFAST]
+        lunch_dinner_pool = candidate_pools[MEAL_TYPE_LUNCH_DINNER]
         
         # Ensure we have options available
-        if breakfast_options.empty or lunch_dinner_options.empty:
+        if breakfast_pool.size == 0 or lunch_dinner_pool.size == 0:
             raise ValueError("Not enough meal options available for your preferences")
+
+        if self.calorie_margin is not None:
+            # Restrict each meal to recipes near its target (binary search), widened
+            # until it holds recipes not yet used twice, or covers the whole pool
+            breakfast_options = self._calorie_window(breakfast_pool, breakfast_target, 1, breakfast_meal_counts)
+            lunch_dinner_options = self._calorie_window(lunch_dinner_pool, lunch_target, 2, lunch_dinner_meal_counts)
+        else:
+            breakfast_options = breakfast_pool.positions
+            lunch_dinner_options = lunch_dinner_pool.positions
         
         # Try to avoid meals that have been used twice already
-        new_breakfast_options = breakfast_options[~breakfast_options['title'].apply(
-            lambda x: breakfast_meal_counts.get(x, 0) >= 2
-        )]
-        if not new_breakfast_options.empty:
+        new_breakfast_options = breakfast_options[breakfast_meal_counts[store.title_id[breakfast_options]] < 2]
+        if new_breakfast_options.size:
             breakfast_options = new_breakfast_options
         
-        # Try to avoid lunch/dinner meals that have been used twice already
-        new_lunch_dinner_options = lunch_dinner_options[~lunch_dinner_options['title'].apply(
-            lambda x: lunch_dinner_meal_counts.get(x, 0) >= 2
-        )]
-        if not new_lunch_dinner_options.empty and len(new_lunch_dinner_options) >= 2:
+        # Try to avoid lunch/dinner meals that have been used twice already,
+        # as long as two different titles are left for lunch and dinner
+        new_lunch_dinner_options = lunch_dinner_options[
+            lunch_dinner_meal_counts[store.title_id[lunch_dinner_options]] < 2
+        ]
+        new_titles = store.title_id[new_lunch_dinner_options]
+        if new_titles.size >= 2 and (new_titles != new_titles[0]).any():
             lunch_dinner_options = new_lunch_dinner_options
-            
-        # Function to round to nearest allowed serving size
-        def round_to_serving_size(serving):
-            allowed_servings = [0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, 5]
-            return min(allowed_servings, key=lambda x: abs(x - serving))
-
-        # Function to calculate optimal serving size for target calories
-        def calculate_optimal_serving(meal, target_calories):
-            if meal['calories'] <= 0:
-                return 1.0
-            ideal_servings = target_calories / meal['calories']
-            # Limit between 0.5 and 5 servings
-            ideal_servings = max(0.5, min(5, ideal_servings))
-            return round_to_serving_size(ideal_servings)
-
-        # Sample breakfast
-        breakfast = breakfast_options.sample(n=1).iloc[0]
-        breakfast_servings = calculate_optimal_serving(breakfast, breakfast_target)
-        
-        # Sample lunch
-        lunch = lunch_dinner_options.sample(n=1).iloc[0]
-        lunch_servings = calculate_optimal_serving(lunch, lunch_target)
+
+        if self.selection_mode == 'optimize':
+            # Choose the meals and servings jointly against the 40/30/30 targets
+            meals, servings = optimize_day(
+                store, breakfast_options, lunch_dinner_options,
+                (breakfast_target, lunch_target, dinner_target), adjusted_tdee, rng,
+                budget_ms=self.optimizer_budget_ms,
+            )
+        else:
+            meals, servings = self._sample_daily_meals(
+                breakfast_options, lunch_dinner_options,
+                (breakfast_target, lunch_target, dinner_target), adjusted_tdee, rng,
+            )
+
+        # Update usage counters
+        self._count_day(meals, breakfast_meal_counts, lunch_dinner_meal_counts)
+
+        return meals, servings
+
+    def _calorie_window(self, pool: CandidatePool, target: float, min_options: int,
+                        counts: np.ndarray, excluded=()) -> np.ndarray:
+        """
+        Pool positions within calorie_margin of target, widened until they hold
+        at least min_options distinct usable titles (used fewer than twice per
+        counts and not in excluded), or until they cover the whole pool.
+        """
+        title_id = self.store.title_id
+
+        def usable(positions: np.ndarray) -> np.ndarray:
+            titles = title_id[positions]
+            mask = counts[titles] < 2
+            if len(excluded):
+                mask &= ~np.isin(titles, excluded)
+            return mask
+
+        def enough(positions: np.ndarray) -> bool:
+            titles = title_id[positions][usable(positions)]
+            return titles.size >= min_options and np.unique(titles).size >= min_options
+
+        window = pool.calorie_window(target, self.calorie_margin, min_options)
+        if enough(window):
+            return window
+        pool_usable = usable(pool.positions)
+        window = pool.calorie_window(target, self.calorie_margin, min_options, pool_usable)
+        if window.size == pool.size or enough(window):
+            return window
+        # The usable recipes found are copies of fewer titles; widen until others turn up
+        found = np.unique(title_id[window][usable(window)])
+        return pool.calorie_window(target, self.calorie_margin, min_options - found.size,
+                                   pool_usable & ~np.isin(title_id[pool.positions], found))
+
+    def _sample_daily_meals(
+        self, breakfast_options: np.ndarray, lunch_dinner_options: np.ndarray,
+        targets: Tuple[int, int, int], adjusted_tdee: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Random meals with servings rounded toward their targets; returns (meals, servings)."""
+        store = self.store
+
+        # Sample breakfast and lunch
+        breakfast = rng.choice(breakfast_options)
+        lunch = rng.choice(lunch_dinner_options)
         
         # Sample dinner (ensuring it's different from lunch)
-        dinner_options = lunch_dinner_options[lunch_dinner_options['title'] != lunch['title']]
-        if dinner_options.empty:
+        dinner_options = lunch_dinner_options[store.title_id[lunch_dinner_options] != store.title_id[lunch]]
+        if dinner_options.size == 0:
             # If no other options, accept a repeated meal as last resort
-            dinner = lunch_dinner_options.sample(n=1).iloc[0]
-        else:
-            dinner = dinner_options.sample(n=1).iloc[0]
-        dinner_servings = calculate_optimal_serving(dinner, dinner_target)
+            dinner_options = lunch_dinner_options
+        dinner = rng.choice(dinner_options)
+
+        # Optimal servings for all three meals in one vectorized pass (0.5-5.0 grid)
+        meals = np.array([breakfast, lunch, dinner])
+        calories = store.calories[meals]
+        servings = optimal_servings(calories, targets)
         
         # Calculate actual total calories and adjust if needed
-        total_calories = (breakfast['calories'] * breakfast_servings + 
-                          lunch['calories'] * lunch_servings + 
-                          dinner['calories'] * dinner_servings)
+        total_calories = float(calories @ servings)
         
         # Fine-tune to get closer to target TDEE if we're off by more than 15%
         if abs(total_calories - adjusted_tdee) > (adjusted_tdee * 0.15):
-            # Try adjusting the largest meal first
-            meals = [
-                {"meal": breakfast, "servings": breakfast_servings, "target": breakfast_target},
-                {"meal": lunch, "servings": lunch_servings, "target": lunch_target},
-                {"meal": dinner, "servings": dinner_servings, "target": dinner_target}
-            ]
-            
-            # Sort by caloric contribution
-            meals.sort(key=lambda x: x["meal"]['calories'] * x["servings"], reverse=True)
-            
-            # Adjust the meal with highest contribution
+            # Adjust the meal with highest caloric contribution
+            largest = int(np.argmax(calories * servings))
             if total_calories > adjusted_tdee:
                 # Need to reduce calories
-                new_servings = max(0.5, meals[0]["servings"] - 0.5)
-                if meals[0]["meal"] is breakfast:
-                    breakfast_servings = new_servings
-                elif meals[0]["meal"] is lunch:
-                    lunch_servings = new_servings
-                else:
-                    dinner_servings = new_servings
+                servings[largest] = max(MIN_SERVINGS, servings[largest] - 0.5)
             else:
                 # Need to increase calories
-                new_servings = min(5.0, meals[0]["servings"] + 0.5)
-                if meals[0]["meal"] is breakfast:
-                    breakfast_servings = new_servings
-                elif meals[0]["meal"] is lunch:
-                    lunch_servings = new_servings
-                else:
-                    dinner_servings = new_servings
+                servings[largest] = min(MAX_SERVINGS, servings[largest] + 0.5)
 
+        return meals, servings
+
+    def _daily_record(self, meals: np.ndarray, servings: np.ndarray) -> Dict:
+        """Day entry for breakfast/lunch/dinner positions and their servings, plus the fixed rice."""
+        store = self.store
         return {
-            'Breakfast': {
-                'title': breakfast['title'], 
-                'calories': breakfast['calories'],
-                'servings': breakfast_servings,
-                'total_calories': breakfast['calories'] * breakfast_servings
-            },
-            'Lunch': {
-                'title': lunch['title'], 
-                'calories': lunch['calories'],
-                'servings': lunch_servings,
-                'total_calories': lunch['calories'] * lunch_servings
-            },
-            'Dinner': {
-                'title': dinner['title'], 
-                'calories': dinner['calories'],
-                'servings': dinner_servings,
-                'total_calories': dinner['calories'] * dinner_servings
-            },
+            'Breakfast': store.meal_record(meals[0], servings[0]),
+            'Lunch': store.meal_record(meals[1], servings[1]),
+            'Dinner': store.meal_record(meals[2], servings[2]),
             'Rice': {
                 'title': 'Rice',
-                'calories': rice_calories,
+                'calories': RICE_CALORIES,
                 'servings': 1,
-                'total_calories': rice_calories
+                'total_calories': RICE_CALORIES
             },
             'Daily_Total': {
-                'calories': (breakfast['calories'] * breakfast_servings + 
-                            lunch['calories'] * lunch_servings + 
-                            dinner['calories'] * dinner_servings + 
-                            rice_calories)
+                'calories': plain_number(store.calories[meals] @ servings + RICE_CALORIES)
             }
         }
 
@@ -334,145 +1007,745 @@ class MealPlanner:
         return True
 
 
-@app.route('/predict_meal_plan', methods=['POST'])
-def predict_meal_plan():
-    try:
-        data = request.get_json()
-        print(f"Received request data: {data}")
+class PlannerRegistry:
+    """
+    Process-level holder for the shared MealPlanner.
+
+    The planner is built once (eagerly via load() at worker start, or lazily
+    on the first get()) and then shared read-only by every request thread.
+    reload() builds a replacement off to the side and swaps it in atomically,
+    so in-flight requests keep using the planner they already fetched.
+    generation counts this process's reloads; caches key on the planner's
+    plan_signature instead, which also holds across restarts and deploys.
+
+    is_ready turns true once warm_up() has built the planner and run a
+    throwaway plan through it; start_warm_up() does that on a background
+    thread so the server can answer health checks meanwhile.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._planner = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.generation = 0
+        self.warm_up_error = None
+
+    def get(self) -> MealPlanner:
+        planner = self._planner
+        if planner is None:
+            with self._lock:
+                if self._planner is None:
+                    self._planner = self._factory()
+                planner = self._planner
+        return planner
+
+    def load(self) -> MealPlanner:
+        """Build the planner now if it has not been built yet."""
+        return self.get()
+
+    def warm_up(self) -> MealPlanner:
+        """Build the planner if needed, warm it up and mark the registry ready."""
+        try:
+            planner = self.get()
+            planner.warm_up()
+        except Exception as e:
+            self.warm_up_error = str(e)
+            raise
+        self.warm_up_error = None
+        self._ready.set()
+        return planner
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run warm_up() on a daemon thread; failures are logged and reported by /ready."""
+        def run():
+            try:
+                self.warm_up()
+                print("Planner warmed up and ready")
+            except Exception as e:
+                print(f"Planner warm-up failed: {e}")
+        thread = threading.Thread(target=run, name='planner-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def reload(self) -> MealPlanner:
+        """Rebuild the planner (e.g. after the recipe CSVs change), warm it up and swap it in."""
+        planner = self._factory()
+        planner.warm_up()
+        with self._lock:
+            self._planner = planner
+            self.generation += 1
+        return planner
+
+    def after_fork(self):
+        """Per-worker reset after a preloading server (gunicorn preload_app) forks."""
+        self._lock = threading.Lock()
+        ready, self._ready = self._ready.is_set(), threading.Event()
+        if ready:
+            self._ready.set()
+        if self._planner is not None:
+            self._planner.after_fork()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._planner is not None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+
+BREAKFAST_PATH = os.environ.get('BREAKFAST_PATH', 'bf_final_updated_recipes_1.csv')
+LUNCH_PATH = os.environ.get('LUNCH_PATH', 'lunch_final_updated_recipes_1.csv')
+# Directory produced by build_artifacts.py; when unset the planner trains at startup
+PLANNER_ARTIFACT_DIR = os.environ.get('PLANNER_ARTIFACT_DIR')
+# Optional planner-wide seed, making the sequence of unseeded plans replayable
+PLANNER_SEED = int(os.environ['PLANNER_SEED']) if os.environ.get('PLANNER_SEED') else None
+# Set to 0 to disable calorie bands: the random forest is then neither trained nor loaded
+PLANNER_CALORIE_BANDS = os.environ.get('PLANNER_CALORIE_BANDS', '1') != '0'
+# Set to 1 to relax preferences that leave too few meals (allergies are never relaxed)
+PLANNER_PREFERENCE_FALLBACK = os.environ.get('PLANNER_PREFERENCE_FALLBACK', '0') == '1'
+# When set, each meal is drawn from recipes within this many calories of its target
+PLANNER_CALORIE_MARGIN = float(os.environ['PLANNER_CALORIE_MARGIN']) if os.environ.get('PLANNER_CALORIE_MARGIN') else None
+# 'sample' (default) or 'optimize'; the budget caps the optimizer's time per day
+PLANNER_SELECTION_MODE = os.environ.get('PLANNER_SELECTION_MODE', 'sample')
+PLANNER_OPTIMIZER_BUDGET_MS = float(os.environ.get('PLANNER_OPTIMIZER_BUDGET_MS', 5.0))
+# When set, each greedy week is refined by the whole-week solver for this long
+PLANNER_WEEK_SOLVER_BUDGET_MS = (float(os.environ['PLANNER_WEEK_SOLVER_BUDGET_MS'])
+                                 if os.environ.get('PLANNER_WEEK_SOLVER_BUDGET_MS') else None)
+
+
+# Tracing (see tracing.py): PLANNER_TRACE_FILE appends spans as JSON lines,
+# PLANNER_TRACE=memory keeps them in planner.tracer.exporter; off by default
+PLANNER_TRACE_FILE = os.environ.get('PLANNER_TRACE_FILE')
+PLANNER_TRACE = os.environ.get('PLANNER_TRACE', 'file' if PLANNER_TRACE_FILE else 'off').lower()
+PLANNER_TRACE_SAMPLE_RATE = float(os.environ.get('PLANNER_TRACE_SAMPLE_RATE', 1.0))
+
+
+def build_tracer() -> Tracer:
+    if PLANNER_TRACE == 'file' and PLANNER_TRACE_FILE:
+        return Tracer(FileExporter(PLANNER_TRACE_FILE), sample_rate=PLANNER_TRACE_SAMPLE_RATE)
+    if PLANNER_TRACE == 'memory':
+        return Tracer(InMemoryExporter(), sample_rate=PLANNER_TRACE_SAMPLE_RATE)
+    return NULL_TRACER
+
+
+def build_planner() -> MealPlanner:
+    options = dict(
+        seed=PLANNER_SEED,
+        calorie_bands=PLANNER_CALORIE_BANDS,
+        preference_fallback=PLANNER_PREFERENCE_FALLBACK,
+        calorie_margin=PLANNER_CALORIE_MARGIN,
+        selection_mode=PLANNER_SELECTION_MODE,
+        optimizer_budget_ms=PLANNER_OPTIMIZER_BUDGET_MS,
+        week_solver_budget_ms=PLANNER_WEEK_SOLVER_BUDGET_MS,
+        tracer=build_tracer(),
+    )
+    if PLANNER_ARTIFACT_DIR:
+        try:
+            return MealPlanner.from_artifacts(PLANNER_ARTIFACT_DIR, BREAKFAST_PATH, LUNCH_PATH, **options)
+        except ArtifactMismatchError as e:
+            print(f"Model artifacts unusable, training from scratch instead: {e}")
+    return MealPlanner(BREAKFAST_PATH, LUNCH_PATH, **options)
+
+
+planner_registry = PlannerRegistry(build_planner)
+
+def build_plan_cache() -> PlanCache:
+    """
+    Serialized responses of seeded plan requests. PLAN_CACHE_BACKEND picks
+    'memory' (per worker, default) or 'redis' (shared, PLAN_CACHE_REDIS_URL);
+    PLAN_CACHE_SIZE=0 disables caching.
+    """
+    max_entries = int(os.environ.get('PLAN_CACHE_SIZE', 1024))
+    backend_name = os.environ.get('PLAN_CACHE_BACKEND', 'memory').lower()
+    if backend_name == 'redis':
+        backend = RedisBackend.from_url(os.environ.get('PLAN_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    else:
+        backend = InProcessBackend(max_entries=max_entries)
+    return PlanCache(
+        backend=backend,
+        ttl_seconds=float(os.environ.get('PLAN_CACHE_TTL', 3600)),
+        enabled=max_entries > 0,
+    )
+
+
+plan_cache = build_plan_cache()
+
+
+def parse_dietary_preferences(data: Dict) -> DietaryPreferences:
+    """
+    Build DietaryPreferences from the request's dietary_restrictions and
+    allergies fields; raises ValueError when either holds something other
+    than strings.
+    """
+    # Extract dietary preferences from request format
+    dietary_restrictions = data.get('dietary_restrictions', [])
+    allergies = data.get('allergies', [])
+    
+    # Handle different formats of dietary_restrictions
+    if isinstance(dietary_restrictions, dict):
+        diet_list = [k for k, v in dietary_restrictions.items() if v]
+    elif isinstance(dietary_restrictions, list):
+        diet_list = dietary_restrictions
+    elif isinstance(dietary_restrictions, str):
+        diet_list = [r.strip() for r in dietary_restrictions.split(',')]
+    else:
+        diet_list = []
         
-        # Extract dietary preferences from request format
-        dietary_restrictions = data.get('dietary_restrictions', [])
-        allergies = data.get('allergies', [])
+    # Handle allergies string format
+    if isinstance(allergies, str):
+        allergies = [r.strip() for r in allergies.split(',')]
+    elif not isinstance(allergies, (list, dict)):
+        raise ValueError("'allergies' must be a list or a comma-separated string")
+
+    if not all(isinstance(d, str) for d in diet_list):
+        raise ValueError("'dietary_restrictions' must only contain strings")
+    if not all(isinstance(a, str) for a in allergies):
+        raise ValueError("'allergies' must only contain strings")
         
-        # Handle different formats of dietary_restrictions
-        if isinstance(dietary_restrictions, dict):
-            diet_list = [k for k, v in dietary_restrictions.items() if v]
-        elif isinstance(dietary_restrictions, list):
-            diet_list = dietary_restrictions
-        elif isinstance(dietary_restrictions, str):
-            diet_list = [r.strip() for r in dietary_restrictions.split(',')]
-        else:
-            diet_list = []
+    # Convert all to lowercase for case-insensitive matching
+    diet_list = [d.lower() for d in diet_list if d]
+    allergies = [a.lower() for a in allergies if a]
+    
+    # Create preferences object
+    return DietaryPreferences(
+        vegetarian='vegetarian' in diet_list,
+        low_purine='low purine' in diet_list or 'low-purine' in diet_list,
+        low_fat='low fat' in diet_list or 'low-fat' in diet_list or 'heart healthy' in diet_list,
+        low_sodium='low sodium' in diet_list or 'low-sodium' in diet_list,
+        lactose_free='lactose free' in diet_list or 'lactose-free' in diet_list or 'lactose intolerant' in diet_list,
+        peanut_allergy=any('peanut' in a.lower() for a in allergies),
+        shellfish_allergy=any('shellfish' in a.lower() for a in allergies),
+        fish_allergy=any('fish' in a.lower() for a in allergies) and not any('shellfish' in a.lower() for a in allergies),
+        halal_or_kosher='halal' in diet_list or 'kosher' in diet_list
+    )
+
+
+def resolve_tdee(data: Dict) -> int:
+    """Use the provided TDEE, or calculate it from the body measurements; 2000 if the inputs are unusable."""
+    try:
+        tdee = int(data.get('tdee', 0))
+        if tdee <= 0:
+            weight = float(data.get('weight', 70))
+            height = float(data.get('height', 170))
+            age = int(data.get('age', 30))
+            gender = data.get('gender', 'M')
             
-        # Handle allergies string format
-        if isinstance(allergies, str):
-            allergies = [r.strip() for r in allergies.split(',')]
+            activity_level_map = {
+                'sedentary': 1.2,
+                'lightly_active': 1.375,
+                'moderately_active': 1.55,
+                'very_active': 1.725,
+                'extra_active': 1.9
+            }
+            activity_level_str = data.get('activity_level', 'moderately_active')
+            activity_level = activity_level_map.get(activity_level_str, 1.55)
             
-        # Convert all to lowercase for case-insensitive matching
-        diet_list = [d.lower() for d in diet_list if d]
-        allergies = [a.lower() for a in allergies if a]
-        
-        # Create preferences object
-        preferences = DietaryPreferences(
-            vegetarian='vegetarian' in diet_list,
-            low_purine='low purine' in diet_list or 'low-purine' in diet_list,
-            low_fat='low fat' in diet_list or 'low-fat' in diet_list or 'heart healthy' in diet_list,
-            low_sodium='low sodium' in diet_list or 'low-sodium' in diet_list,
-            lactose_free='lactose free' in diet_list or 'lactose-free' in diet_list or 'lactose intolerant' in diet_list,
-            peanut_allergy=any('peanut' in a.lower() for a in allergies),
-            shellfish_allergy=any('shellfish' in a.lower() for a in allergies),
-            fish_allergy=any('fish' in a.lower() for a in allergies) and not any('shellfish' in a.lower() for a in allergies),
-            halal_or_kosher='halal' in diet_list or 'kosher' in diet_list
-        )
-        
-        # Calculate or use provided TDEE
+            bmr = calculate_bmr(weight, height, age, gender)
+            tdee = int(calculate_tdee(bmr, activity_level))
+        return tdee
+    except Exception as e:
+        print(f"Error calculating TDEE: {e}, using default")
+        return 2000
+
+
+# Add validation for minimum TDEE
+MIN_TDEE = 500
+TDEE_TOO_LOW_RESPONSE = {
+    'error': 'TDEE too low',
+    'message': 'Cannot generate meal plan for TDEE below 500 calories. Please check your inputs.'
+}
+NO_MEALS_MESSAGE = 'Unable to generate meal plan with current preferences. Please try with fewer dietary restrictions.'
+
+def parse_seed(data: Dict) -> Optional[int]:
+    """Optional integer 'seed' field; raises ValueError for anything else."""
+    seed = data.get('seed')
+    if seed is None:
+        return None
+    if isinstance(seed, bool) or not isinstance(seed, (int, str)) or not str(seed).strip().isdigit():
+        raise ValueError("'seed' must be a non-negative integer")
+    return int(seed)
+
+
+# Upper bound on users per /predict_meal_plan/batch call
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 500))
+# Longest horizon a single /predict_meal_plan call may ask for (12 weeks by default)
+MAX_PLAN_DAYS = int(os.environ.get('MAX_PLAN_DAYS', 84))
+
+
+def parse_horizon(data: Dict) -> Optional[int]:
+    """
+    Plan length in days from the optional 'days' or 'weeks' field.
+
+    None when neither is given (the classic one-week response); raises
+    ValueError for non-integers or horizons outside 1..MAX_PLAN_DAYS.
+    """
+    if data.get('days') is not None:
+        field, value, unit = 'days', data['days'], 1
+    elif data.get('weeks') is not None:
+        field, value, unit = 'weeks', data['weeks'], len(WEEK_DAYS)
+    else:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+        raise ValueError(f"'{field}' must be a positive integer")
+    days = int(value) * unit
+    if not 1 <= days <= MAX_PLAN_DAYS:
+        raise ValueError(f"Plan horizon must be between 1 and {MAX_PLAN_DAYS} days")
+    return days
+
+
+def parse_start_date(data: Dict):
+    """Optional 'start_date' (YYYY-MM-DD); None when absent, ValueError when malformed."""
+    start_date = data.get('start_date')
+    if start_date is None:
+        return None
+    try:
+        return datetime.strptime(str(start_date), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("'start_date' must be a date in YYYY-MM-DD format")
+
+
+def next_monday(today=None):
+    """The Monday plans start on: next week's Monday, even when today is a Monday."""
+    today = today or datetime.now().date()
+    days_until_monday = (7 - today.weekday()) % 7
+    if days_until_monday == 0:
+        days_until_monday = 7
+    return today + timedelta(days=days_until_monday)
+
+
+def format_dated_day(daily_plan: Dict, current_date) -> Dict:
+    """
+    Shape one MealPlanner day into the dated API response format.
+
+    Planner meal records already hold plain Python values in the response's
+    title/calories/servings/total_calories shape, so they are used as is.
+    """
+    breakfast, lunch, dinner = (daily_plan[meal] for meal in MEAL_SLOTS)
+    return {
+        'date': current_date.strftime('%Y-%m-%d'),
+        'breakfast': breakfast['title'],
+        'lunch': lunch['title'],
+        'dinner': dinner['title'],
+        'meals': {
+            'breakfast': breakfast,
+            'lunch': lunch,
+            'dinner': dinner
+        }
+    }
+
+
+def format_dated_plan(weekly_plan: Dict, start_date) -> Dict:
+    """Shape a MealPlanner weekly plan into the dated API response format."""
+    return {
+        day: format_dated_day(weekly_plan[day], start_date + timedelta(days=i))
+        for i, day in enumerate(WEEK_DAYS)
+    }
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Batch requests per planner call when a batch response is streamed
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 64))
+
+
+def wants_stream(data: Dict) -> bool:
+    """NDJSON output was asked for, via "stream": true or an Accept header preferring it."""
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    return request.accept_mimetypes.best_match([app.json.mimetype, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def error_response(payload: Dict, status: int, error_type: str):
+    """JSON error response, counted in REQUEST_ERRORS under error_type."""
+    REQUEST_ERRORS.inc(endpoint=request.endpoint, error=error_type)
+    return jsonify(payload), status
+
+
+def ndjson_response(lines: Iterator[Dict]) -> Response:
+    """
+    Stream objects as newline-delimited JSON, serializing each one as it is produced.
+
+    The status line is already sent when lines is consumed, so an exception
+    part-way through ends the stream with a final {"error": ...} line.
+    """
+    endpoint = request.endpoint
+
+    def generate():
         try:
-            tdee = int(data.get('tdee', 0))
-            if tdee <= 0:
-                weight = float(data.get('weight', 70))
-                height = float(data.get('height', 170))
-                age = int(data.get('age', 30))
-                gender = data.get('gender', 'M')
-                
-                activity_level_map = {
-                    'sedentary': 1.2,
-                    'lightly_active': 1.375,
-                    'moderately_active': 1.55,
-                    'very_active': 1.725,
-                    'extra_active': 1.9
-                }
-                activity_level_str = data.get('activity_level', 'moderately_active')
-                activity_level = activity_level_map.get(activity_level_str, 1.55)
-                
-                bmr = calculate_bmr(weight, height, age, gender)
-                tdee = int(calculate_tdee(bmr, activity_level))
-            
-            # Add validation for minimum TDEE
-            if tdee < 500:
-                return jsonify({
-                    'error': 'TDEE too low',
-                    'message': 'Cannot generate meal plan for TDEE below 500 calories. Please check your inputs.'
-                }), 400
-                
+            for line in lines:
+                yield app.json.dumps_bytes(line) + b'\n'
         except Exception as e:
-            print(f"Error calculating TDEE: {e}, using default")
-            tdee = 2000
+            print(f"Error while streaming response: {str(e)}")
+            REQUEST_ERRORS.inc(endpoint=endpoint, error='internal')
+            yield app.json.dumps_bytes({'error': str(e)}) + b'\n'
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+def iter_dated_days(daily_plans, start_date) -> Iterator[Dict]:
+    """Dated entries for a horizon of daily plans; each also names its weekday under 'day'."""
+    for i, daily_plan in enumerate(daily_plans):
+        current_date = start_date + timedelta(days=i)
+        yield {'day': current_date.strftime('%A'), **format_dated_day(daily_plan, current_date)}
+
+
+def parse_plan_number(value, field: str, positive: bool = False) -> float:
+    """A non-negative (or, with positive, strictly positive) number from a plan record; ValueError otherwise."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{field} must be a number")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a number")
+    if not np.isfinite(number) or number < 0 or (positive and number == 0):
+        raise ValueError(f"{field} must be a {'positive' if positive else 'non-negative'} number")
+    return number
+
+
+def parse_dated_plan(dated_weekly_plan: Dict):
+    """
+    Inverse of format_dated_plan: (weekly_plan, start_date) from an API plan.
+
+    start_date is read from Monday's date when present, else the next Monday.
+    Raises ValueError for a plan missing any day or meal, or whose meal
+    records are malformed (non-object records, non-string titles,
+    non-numeric calories or servings).
+    """
+    if not isinstance(dated_weekly_plan, dict):
+        raise ValueError("'predicted_meal_plan' must be an object keyed by day")
+    weekly_plan = {}
+    for day in WEEK_DAYS:
+        day_plan = dated_weekly_plan.get(day)
+        if not isinstance(day_plan, dict):
+            raise ValueError(f"'predicted_meal_plan' is missing {day}")
+        meals = day_plan.get('meals', {})
+        if not isinstance(meals, dict):
+            raise ValueError(f"'predicted_meal_plan' {day} 'meals' must be an object")
+        weekly_plan[day] = {}
+        for meal in MEAL_SLOTS:
+            field = f"'predicted_meal_plan' {day} {meal.lower()}"
+            record = meals.get(meal.lower()) or {'title': day_plan.get(meal.lower())}
+            if not isinstance(record, dict):
+                raise ValueError(f"{field} must be an object")
+            if not record.get('title'):
+                raise ValueError(f"'predicted_meal_plan' is missing {day} {meal.lower()}")
+            if not isinstance(record['title'], str):
+                raise ValueError(f"{field} title must be a string")
+            calories = record.get('calories')
+            weekly_plan[day][meal] = {
+                'title': record['title'],
+                'calories': None if calories is None else parse_plan_number(calories, f"{field} calories"),
+                'servings': parse_plan_number(record.get('servings', 1), f"{field} servings", positive=True),
+            }
+    try:
+        start_date = datetime.strptime(dated_weekly_plan['Monday']['date'], '%Y-%m-%d').date()
+    except (KeyError, TypeError, ValueError):
+        start_date = next_monday()
+    return weekly_plan, start_date
+
+
+def parse_replan_slots(data: Dict) -> List[Tuple[str, str]]:
+    """
+    (day, meal) pairs from 'replace': [{"day": "Monday", "meal": "lunch"}, ...].
+
+    Leaving out "meal" replaces the whole day. Raises ValueError otherwise.
+    """
+    replace = data.get('replace')
+    if not isinstance(replace, list) or not replace:
+        raise ValueError("'replace' must be a non-empty list of {\"day\", \"meal\"} objects")
+    slots = []
+    for item in replace:
+        day = item.get('day') if isinstance(item, dict) else None
+        meal = item.get('meal') if isinstance(item, dict) else None
+        if day not in WEEK_DAYS:
+            raise ValueError(f"Unknown day in 'replace': {day!r}")
+        if meal is None:
+            slots.extend((day, slot) for slot in MEAL_SLOTS)
+        elif isinstance(meal, str) and meal.capitalize() in MEAL_SLOTS:
+            slots.append((day, meal.capitalize()))
+        else:
+            raise ValueError(f"Unknown meal in 'replace': {meal!r}")
+    return slots
+
+
+@app.route('/predict_meal_plan', methods=['POST'])
+def predict_meal_plan():
+    """
+    Weekly plan starting next Monday, keyed by day name. With a "seed" the
+    plan is reproducible, and a /predict_meal_plan/batch item with the same
+    body and seed gets the same plan.
+
+    With "days" or "weeks" (up to MAX_PLAN_DAYS) and/or "start_date", the
+    plan instead covers that horizon and comes back as a list of dated days,
+    with variety enforced over any 7 consecutive days. With "stream": true
+    (or Accept: application/x-ndjson) those days are streamed one NDJSON
+    line each as they are generated; streamed plans bypass the plan cache.
+    """
+    try:
+        with STAGE_LATENCY.time(stage='parse_request'):
+            data = request.get_json()
+            print(f"Received request data: {data}")
             
-        # Initialize meal planner and generate weekly plan
-        planner = MealPlanner(
-            breakfast_path='bf_final_updated_recipes_1.csv',
-            lunch_path='lunch_final_updated_recipes_1.csv'
-        )
+            try:
+                preferences = parse_dietary_preferences(data)
+                seed = parse_seed(data)
+                days = parse_horizon(data)
+                requested_start = parse_start_date(data)
+            except ValueError as e:
+                return error_response({'error': str(e)}, 400, 'bad_request')
+        with STAGE_LATENCY.time(stage='resolve_tdee'):
+            tdee = resolve_tdee(data)
+        if tdee < MIN_TDEE:
+            return error_response(TDEE_TOO_LOW_RESPONSE, 400, 'tdee_too_low')
+        start_date = requested_start or next_monday()
+        stream = wants_stream(data)
+        horizon_request = days is not None or requested_start is not None or stream
+        if horizon_request:
+            days = days or len(WEEK_DAYS)
+
+        # Reuse the shared meal planner (trained once per worker)
+        planner = planner_registry.get()
+        if stream:
+            try:
+                # Filter preferences and produce the first day up front so an empty pool still gets a 400
+                dated_days = iter_dated_days(planner.iter_plan_days(tdee, preferences, days, seed=seed), start_date)
+                first_day = next(dated_days)
+            except ValueError as e:
+                return error_response({'error': str(e), 'message': NO_MEALS_MESSAGE}, 400, 'no_meals')
+            return ndjson_response(itertools.chain([first_day], dated_days))
+            
+        def render_plan() -> bytes:
+            if horizon_request:
+                daily_plans = list(planner.iter_plan_days(tdee, preferences, days, seed=seed))
+                with STAGE_LATENCY.time(stage='format_response'):
+                    return app.json.dumps_bytes({'predicted_meal_plan': list(iter_dated_days(daily_plans, start_date))})
+            weekly_plan = planner.generate_weekly_plan(tdee, preferences, seed=seed)
+            
+            # Format plan with dates
+            with STAGE_LATENCY.time(stage='format_response'):
+                dated_weekly_plan = format_dated_plan(weekly_plan, start_date)
+                return app.json.dumps_bytes({'predicted_meal_plan': dated_weekly_plan})
         
         try:
-            weekly_plan = planner.generate_weekly_plan(tdee, preferences)
+            # Only seeded plans are reproducible, so only those go through the cache
+            if seed is not None:
+                cache_key = plan_cache_key(preferences.to_bitmask(), tdee, seed, start_date,
+                                           planner.plan_signature,
+                                           days=days if horizon_request else None)
+                body = plan_cache.get_or_compute(cache_key, render_plan)
+            else:
+                body = render_plan()
         except ValueError as e:
-            return jsonify({
+            return error_response({
                 'error': str(e),
-                'message': 'Unable to generate meal plan with current preferences. Please try with fewer dietary restrictions.'
-            }), 400
-        
-        # Format plan with dates
-        dated_weekly_plan = {}
-        days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+                'message': NO_MEALS_MESSAGE
+            }, 400, 'no_meals')
         
-        today = datetime.now().date()
-        days_until_monday = (7 - today.weekday()) % 7
-        if days_until_monday == 0:
-            days_until_monday = 7
-        next_monday = today + timedelta(days=days_until_monday)
-        
-        for i, day in enumerate(days_of_week):
-            current_date = next_monday + timedelta(days=i)
-            date_string = current_date.strftime('%Y-%m-%d')
-            
-            dated_weekly_plan[day] = {
-                'date': date_string,
-                'breakfast': weekly_plan[day]['Breakfast']['title'],
-                'lunch': weekly_plan[day]['Lunch']['title'],
-                'dinner': weekly_plan[day]['Dinner']['title'],
-                'meals': {
-                    'breakfast': {
-                        'title': weekly_plan[day]['Breakfast']['title'],
-                        'calories': convert_numpy_types(weekly_plan[day]['Breakfast']['calories']),
-                        'servings': convert_numpy_types(weekly_plan[day]['Breakfast']['servings']),
-                        'total_calories': convert_numpy_types(weekly_plan[day]['Breakfast']['total_calories'])
-                    },
-                    'lunch': {
-                        'title': weekly_plan[day]['Lunch']['title'],
-                        'calories': convert_numpy_types(weekly_plan[day]['Lunch']['calories']),
-                        'servings': convert_numpy_types(weekly_plan[day]['Lunch']['servings']),
-                        'total_calories': convert_numpy_types(weekly_plan[day]['Lunch']['total_calories'])
-                    },
-                    'dinner': {
-                        'title': weekly_plan[day]['Dinner']['title'],
-                        'calories': convert_numpy_types(weekly_plan[day]['Dinner']['calories']),
-                        'servings': convert_numpy_types(weekly_plan[day]['Dinner']['servings']),
-                        'total_calories': convert_numpy_types(weekly_plan[day]['Dinner']['total_calories'])
-                    }
-                }
-            }
-        
-        return jsonify({'predicted_meal_plan': dated_weekly_plan})
+        return Response(body, mimetype=app.json.mimetype)
         
     except Exception as e:
         print(f"Error in predict_meal_plan: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return error_response({'error': str(e)}, 500, 'internal')
+
+
+def batch_plan_results(planner: MealPlanner, items: List[Dict], start_date) -> List[Dict]:
+    """One result per batch item, in order: a dated weekly plan or that item's error."""
+    results = [None] * len(items)
+    plan_requests, plan_slots = [], []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Each batch request must be a JSON object')
+            seed = parse_seed(item)
+            preferences = parse_dietary_preferences(item)
+        except ValueError as e:
+            REQUEST_ERRORS.inc(endpoint='predict_meal_plan_batch', error='bad_request')
+            results[i] = {'error': str(e)}
+            continue
+        tdee = resolve_tdee(item)
+        if tdee < MIN_TDEE:
+            REQUEST_ERRORS.inc(endpoint='predict_meal_plan_batch', error='tdee_too_low')
+            results[i] = TDEE_TOO_LOW_RESPONSE
+            continue
+        plan_requests.append(PlanRequest(tdee=tdee, preferences=preferences, seed=seed))
+        plan_slots.append(i)
+
+    plans = planner.generate_weekly_plans_batch(plan_requests)
+    with STAGE_LATENCY.time(stage='format_response'):
+        for i, plan in zip(plan_slots, plans):
+            if isinstance(plan, ValueError):
+                REQUEST_ERRORS.inc(endpoint='predict_meal_plan_batch', error='no_meals')
+                results[i] = {'error': str(plan), 'message': NO_MEALS_MESSAGE}
+            else:
+                results[i] = {'predicted_meal_plan': format_dated_plan(plan, start_date)}
+    return results
+
+
+@app.route('/predict_meal_plan/batch', methods=['POST'])
+def predict_meal_plan_batch():
+    """
+    Weekly plans for a whole roster in one call.
+
+    Body: {"requests": [<predict_meal_plan body>, ...]}. Results come back in
+    the same order; each is either {"predicted_meal_plan": ...} or an
+    {"error", "message"} object for that user alone. An item with a "seed"
+    gets exactly the plan /predict_meal_plan returns for the same body and
+    seed. When streamed (see
+    wants_stream) each result is one NDJSON line tagged with its "index",
+    computed STREAM_CHUNK_SIZE users at a time.
+    """
+    try:
+        data = request.get_json()
+        items = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return error_response({'error': 'Expected a JSON object with a "requests" list'}, 400, 'bad_request')
+        if len(items) > MAX_BATCH_SIZE:
+            return error_response({'error': f'Batch too large: at most {MAX_BATCH_SIZE} requests per call'},
+                                  400, 'bad_request')
+        print(f"Received batch request for {len(items)} plans")
+
+        planner = planner_registry.get()
+        start_date = next_monday()
+        if wants_stream(data):
+            def lines() -> Iterator[Dict]:
+                for chunk_start in range(0, len(items), STREAM_CHUNK_SIZE):
+                    chunk = items[chunk_start:chunk_start + STREAM_CHUNK_SIZE]
+                    for i, result in enumerate(batch_plan_results(planner, chunk, start_date), chunk_start):
+                        yield {'index': i, **result}
+            return ndjson_response(lines())
+
+        return jsonify({'predicted_meal_plans': batch_plan_results(planner, items, start_date)})
+
+    except Exception as e:
+        print(f"Error in predict_meal_plan_batch: {str(e)}")
+        return error_response({'error': str(e)}, 500, 'internal')
+
+@app.route('/predict_meal_plan/replan', methods=['POST'])
+def replan_meal_plan():
+    """
+    Swap individual meals of an existing weekly plan.
+
+    Body: the usual /predict_meal_plan fields plus "predicted_meal_plan" (the
+    plan as previously returned) and "replace" (see parse_replan_slots).
+    Only the listed meals are regenerated; the rest of the plan is kept.
+    """
+    try:
+        data = request.get_json()
+        try:
+            seed = parse_seed(data)
+            preferences = parse_dietary_preferences(data)
+            weekly_plan, start_date = parse_dated_plan(data.get('predicted_meal_plan'))
+            slots = parse_replan_slots(data)
+        except ValueError as e:
+            return error_response({'error': str(e)}, 400, 'bad_request')
+        tdee = resolve_tdee(data)
+        if tdee < MIN_TDEE:
+            return error_response(TDEE_TOO_LOW_RESPONSE, 400, 'tdee_too_low')
+
+        planner = planner_registry.get()
+        try:
+            weekly_plan = planner.replan_meals(weekly_plan, slots, tdee, preferences, seed=seed)
+        except UnknownRecipeError as e:
+            return error_response({
+                'error': str(e),
+                'message': 'The plan contains a recipe that is no longer available. Replace that meal too, or request a new plan.'
+            }, 400, 'bad_request')
+        except ValueError as e:
+            return error_response({'error': str(e), 'message': NO_MEALS_MESSAGE}, 400, 'no_meals')
+
+        with STAGE_LATENCY.time(stage='format_response'):
+            return jsonify({'predicted_meal_plan': format_dated_plan(weekly_plan, start_date)})
+
+    except Exception as e:
+        print(f"Error in replan_meal_plan: {str(e)}")
+        return error_response({'error': str(e)}, 500, 'internal')
+
+# Idents of threads currently serving a request, for the profiler's thread filter
+ACTIVE_REQUEST_THREADS = set()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    ACTIVE_REQUEST_THREADS.add(threading.get_ident())
+
+@app.teardown_request
+def end_request(exc):
+    ACTIVE_REQUEST_THREADS.discard(threading.get_ident())
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_COUNT.inc(endpoint=endpoint, status=response.status_code)
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's request and stage metrics."""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+# Sampling profiler endpoint: off unless PROFILER_ENABLED=1 and an admin token is set
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_ADMIN_TOKEN = os.environ.get('PROFILER_ADMIN_TOKEN', '')
+PROFILER_MAX_SECONDS = float(os.environ.get('PROFILER_MAX_SECONDS', 30))
+_profiler_lock = threading.Lock()
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_worker():
+    """
+    Sample this worker's request threads for a while and return collapsed stacks (text/plain).
+
+    Requires the X-Admin-Token header. Query parameters: seconds (default 5,
+    at most PROFILER_MAX_SECONDS), interval_ms (default 5), lines=1 for line
+    numbers, all_threads=1 to include idle threads. Only one profile runs per
+    worker at a time, and it occupies one request thread for its duration.
+    """
+    if not PROFILER_ENABLED or not PROFILER_ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), PROFILER_ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        seconds = float(request.args.get('seconds', 5))
+        interval = float(request.args.get('interval_ms', 5)) / 1000.0
+    except ValueError:
+        return jsonify({'error': "'seconds' and 'interval_ms' must be numbers"}), 400
+    if not 0 < seconds <= PROFILER_MAX_SECONDS or not 0 < interval <= 1:
+        return jsonify({'error': f"'seconds' must be in (0, {PROFILER_MAX_SECONDS}] and 'interval_ms' in (0, 1000]"}), 400
+    if not _profiler_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already running in this worker'}), 409
+    try:
+        thread_filter = None if request.args.get('all_threads') == '1' else ACTIVE_REQUEST_THREADS.__contains__
+        profiler = SamplingProfiler(interval=interval, thread_filter=thread_filter,
+                                    with_lines=request.args.get('lines') == '1').run(seconds)
+    finally:
+        _profiler_lock.release()
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(profiler.samples)
+    response.headers['X-Profile-Pid'] = str(os.getpid())
+    return response
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(plan_cache.stats())
 
 @app.route('/health', methods=['GET'])
 def health_check():
+    """Liveness: the process is up. Use /ready to decide whether to route traffic here."""
     return jsonify({'status': 'healthy'})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once the planner is loaded and warmed up, 503 until then."""
+    if planner_registry.is_ready:
+        return jsonify({'status': 'ready', 'generation': planner_registry.generation})
+    if planner_registry.warm_up_error:
+        return jsonify({'status': 'failed', 'error': planner_registry.warm_up_error}), 503
+    return jsonify({'status': 'warming_up'}), 503
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    # Load and warm up the planner in the background; /ready reports when it is done
+    planner_registry.start_warm_up()
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
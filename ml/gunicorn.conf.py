@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for the meal planning API (see wsgi.py).
+
+The app is preloaded in the master and shared by forked workers, so adding
+workers costs little extra memory and no extra model loading. Each worker
+also serves requests on a few threads, so slow clients (e.g. reading a
+streamed plan) do not hold up the worker.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+# Loading and training happen before the fork, so workers boot fast
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+# Recycle workers now and then so copy-on-write drift does not accumulate
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    from flaskapi import planner_registry
+    planner_registry.after_fork()
+    if not planner_registry.is_ready:
+        # Not preloaded (PRELOAD_PLANNER=0): each worker warms up on its own
+        planner_registry.start_warm_up()
@@ -0,0 +1,78 @@
+"""
+JSON encoding for the API in one pass, with orjson when it is installed.
+
+Plan responses used to be coerced to native types field by field and then
+walked again by the standard library encoder. FastJSONProvider is
+installed as the Flask app's JSON provider instead, so jsonify() and
+app.json.dumps() handle numpy scalars and arrays while encoding:
+
+* with orjson available (pip install orjson) encoding happens in C, numpy
+  values included, and responses are built straight from its bytes;
+* without it the standard library encoder is used, with a default hook that
+  converts numpy values to their native Python equivalents.
+
+Keys stay sorted as with Flask's default provider. orjson writes non-ASCII
+characters as UTF-8 rather than \\u escapes and NaN as null; both decode to
+the same values in any JSON client. Debug-mode pretty printing and calls
+with explicit json.dumps keyword arguments go through the standard library.
+"""
+import json
+from typing import Any
+
+import numpy as np
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_ORJSON_OPTIONS = (
+    (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS) if orjson else 0
+)
+
+
+def numpy_default(obj: Any) -> Any:
+    """json default hook: numpy scalars and arrays as native values, then Flask's own fallbacks."""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return DefaultJSONProvider.default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(numpy_default)
+
+    def _use_orjson(self, kwargs) -> bool:
+        return orjson is not None and not kwargs and not self._pretty()
+
+    def _pretty(self) -> bool:
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if self._use_orjson(kwargs):
+            return orjson.dumps(obj, default=numpy_default, option=_ORJSON_OPTIONS).decode()
+        return super().dumps(obj, **kwargs)
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        """UTF-8 encoded JSON for obj, without a str round trip when orjson is used."""
+        if self._use_orjson({}):
+            return orjson.dumps(obj, default=numpy_default, option=_ORJSON_OPTIONS)
+        return super().dumps(obj).encode()
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if not self._use_orjson({}):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
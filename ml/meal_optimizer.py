@@ -0,0 +1,102 @@
+"""
+Exact calorie-target optimizer for one day of meals.
+
+The default planner samples breakfast, lunch and dinner at random and then
+rounds servings, so days often land well away from the 40/30/30 split of the
+rice-adjusted TDEE. optimize_day() instead chooses the three recipes and their
+servings jointly, using the precomputed calorie x serving lattice in
+RecipeStore.serving_calories:
+
+1. every option's best serving for its meal target is read off the lattice;
+2. each meal keeps a shortlist of the k best options, with random jitter
+   among near-equal ones so plans still vary from day to day;
+3. all shortlisted (breakfast, lunch, dinner) combinations, each with the
+   best serving and its two neighbours, are scored in one broadcast and the
+   minimum is taken.
+
+Rounds widen k (4, 8, 16) while the latency budget allows and the best day is
+not yet on target. The first round always runs.
+"""
+import time
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from recipe_store import ALLOWED_SERVINGS, RecipeStore
+
+SHORTLIST_SIZES = (4, 8, 16)
+# Options within this fraction of a meal's target count as equally good
+JITTER_FRACTION = 0.05
+# Stop widening once the day is within this fraction of the adjusted TDEE
+ON_TARGET_FRACTION = 0.01
+
+
+def _shortlist(store: RecipeStore, options: np.ndarray, target: float, k: int,
+               rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """The k best options for target as (positions, best serving index) with random tie-breaking."""
+    lattice = store.serving_calories[options]
+    deviation = np.abs(lattice - target)
+    best_serving = deviation.argmin(axis=1)
+    best_deviation = deviation[np.arange(len(options)), best_serving]
+    keys = best_deviation + rng.random(len(options)) * max(target, 1.0) * JITTER_FRACTION
+    if len(options) > k:
+        chosen = np.argpartition(keys, k - 1)[:k]
+    else:
+        chosen = np.arange(len(options))
+    return options[chosen], best_serving[chosen]
+
+
+def _expand_servings(store: RecipeStore, positions: np.ndarray, best_serving: np.ndarray):
+    """Each shortlisted option with its best serving and the grid neighbours on either side."""
+    serving_index = np.clip(best_serving[:, None] + np.array([-1, 0, 1]), 0, len(ALLOWED_SERVINGS) - 1)
+    positions = np.repeat(positions, 3)
+    serving_index = serving_index.ravel()
+    return positions, serving_index, store.serving_calories[positions, serving_index]
+
+
+def optimize_day(store: RecipeStore, breakfast_options: np.ndarray, lunch_dinner_options: np.ndarray,
+                 targets: Sequence[float], adjusted_tdee: float, rng: np.random.Generator,
+                 budget_ms: float = 5.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Jointly pick breakfast, lunch and dinner positions plus servings for one day.
+
+    Minimizes the sum of each meal's deviation from its target plus the day's
+    deviation from adjusted_tdee, with dinner's title differing from lunch's
+    whenever the options allow it. Returns (meals, servings) arrays of length 3.
+    """
+    deadline = time.perf_counter() + budget_ms / 1000.0
+    breakfast_target, lunch_target, dinner_target = (float(t) for t in targets)
+    best = None
+
+    for k in SHORTLIST_SIZES:
+        b_pos, b_srv, b_cal = _expand_servings(store, *_shortlist(store, breakfast_options, breakfast_target, k, rng))
+        l_pos, l_srv, l_cal = _expand_servings(store, *_shortlist(store, lunch_dinner_options, lunch_target, k, rng))
+        d_pos, d_srv, d_cal = _expand_servings(store, *_shortlist(store, lunch_dinner_options, dinner_target, k, rng))
+
+        objective = (
+            np.abs(b_cal - breakfast_target)[:, None, None]
+            + np.abs(l_cal - lunch_target)[None, :, None]
+            + np.abs(d_cal - dinner_target)[None, None, :]
+            + np.abs(b_cal[:, None, None] + l_cal[None, :, None] + d_cal[None, None, :] - adjusted_tdee)
+        )
+        same_title = store.title_id[l_pos][:, None] == store.title_id[d_pos][None, :]
+        if not same_title.all():
+            objective = np.where(same_title[None, :, :], np.inf, objective)
+
+        b, l, d = np.unravel_index(int(objective.argmin()), objective.shape)
+        score = float(objective[b, l, d])
+        if best is None or score < best[0]:
+            best = (score, np.array([b_pos[b], l_pos[l], d_pos[d]]),
+                    ALLOWED_SERVINGS[[b_srv[b], l_srv[l], d_srv[d]]])
+
+        if best[0] <= adjusted_tdee * ON_TARGET_FRACTION or time.perf_counter() >= deadline:
+            break
+
+    return best[1], best[2].copy()
+
+
+def optimize_meal(store: RecipeStore, options: np.ndarray, target: float,
+                  rng: np.random.Generator) -> Tuple[int, float]:
+    """Single-slot version of optimize_day: one (position, servings) near target, used when replanning a meal."""
+    positions, best_serving = _shortlist(store, options, float(target), 1, rng)
+    return int(positions[0]), float(ALLOWED_SERVINGS[best_serving[0]])
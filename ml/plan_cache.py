@@ -0,0 +1,299 @@
+"""
+Response cache for the meal plan endpoints.
+
+Plans are only reproducible when a seed is given, so flaskapi caches seeded
+/predict_meal_plan responses here as already-serialized JSON bytes, keyed on
+everything that determines the plan: the preference bitmask, the resolved
+TDEE, the seed, the Monday the plan starts on and the planner's signature
+(its recipe data fingerprint and plan-affecting options), so entries in a
+shared backend outlive restarts but never leak between different deploys.
+
+Storage is pluggable: InProcessBackend keeps an LRU per worker, RedisBackend
+shares entries between workers through any Redis-protocol server (a local
+redis-server or another stand-in speaking the protocol works). PlanCache sits
+in front of either and adds stampede protection, so a burst of identical cold
+requests runs the plan computation once.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+
+def plan_cache_key(pref_mask: int, tdee: int, seed: int, start_date, planner_signature: str = '',
+                   days: Optional[int] = None) -> str:
+    """Cache key for one seeded plan request; days is the horizon of a multi-week request."""
+    horizon = f":n{days}" if days is not None else ""
+    return f"plan:{planner_signature}:p{pref_mask}:t{tdee}:s{seed}:d{start_date.isoformat()}{horizon}"
+
+
+class CacheBackend(ABC):
+    """
+    Byte-value store used by PlanCache. Subclasses implement get, set, add,
+    delete and delete_if_equals; shared says whether other worker processes
+    see the same entries.
+    """
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        """Set key only if it is absent; True when this call stored it (used as a lock)."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        """Atomically delete key only while it still holds value (releases a lock only its owner holds)."""
+
+    def clear(self):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class InProcessBackend(CacheBackend):
+    """Thread-safe LRU with per-entry TTL, local to one worker process."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live_entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key: str, value: bytes, ttl_seconds: float):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        with self._lock:
+            self._store(key, value, ttl_seconds)
+
+    def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        with self._lock:
+            if self._live_entry(key) is not None:
+                return False
+            self._store(key, value, ttl_seconds)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None or entry[1] != value:
+                return False
+            del self._entries[key]
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Shared backend over a redis-py compatible client (get / set(ex=, nx=) / delete).
+
+    Expiry and eviction are left to the server (configure maxmemory-policy
+    allkeys-lru); keys are namespaced with prefix so clear() only touches ours.
+    delete_if_equals() runs a small Lua script, so the server must support EVAL.
+    """
+    shared = True
+    # Compare-and-delete in one server-side step
+    _DELETE_IF_EQUALS = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, client, prefix: str = 'mealplanner:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = 'mealplanner:') -> 'RedisBackend':
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(
+                "PLAN_CACHE_BACKEND=redis needs the 'redis' package (pip install redis)"
+            ) from e
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    @staticmethod
+    def _ttl_ms(ttl_seconds: float) -> int:
+        return max(1, int(ttl_seconds * 1000))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float):
+        self.client.set(self.prefix + key, value, px=self._ttl_ms(ttl_seconds))
+
+    def add(self, key: str, value: bytes, ttl_seconds: float) -> bool:
+        return bool(self.client.set(self.prefix + key, value, px=self._ttl_ms(ttl_seconds), nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        return bool(self.client.eval(self._DELETE_IF_EQUALS, 1, self.prefix + key, value))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class PlanCache:
+    """
+    Read-through cache for serialized plan responses on top of a CacheBackend.
+
+    get_or_compute() protects against stampedes at two levels: threads of one
+    worker asking for the same key wait on the single in-flight computation,
+    and workers sharing a backend take a short-lived lock key so only one of
+    them computes while the others poll for its result. If the lock holder
+    fails or takes longer than lock_timeout, waiters compute for themselves.
+    The lock key holds a per-holder token and is released only while it
+    still holds that token, so a holder whose lock expired never deletes the
+    next holder's lock. Backends that are not shared skip the lock key: the
+    in-process single flight already covers them, and the key would take an
+    LRU slot from a real entry.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl_seconds: float = 3600.0,
+                 enabled: bool = True, lock_timeout: float = 10.0, poll_interval: float = 0.02):
+        self.backend = backend if backend is not None else InProcessBackend()
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _count(self, counter: str):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.backend.get(key) if self.enabled else None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key: str, value: bytes):
+        if self.enabled:
+            self.backend.set(key, value, self.ttl_seconds)
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        """Cached value for key, or compute(), store and return it; exceptions from compute propagate."""
+        if not self.enabled:
+            return compute()
+
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        # In-process single flight: one thread per key computes, the rest wait for it
+        with self._inflight_lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            event.wait(self.lock_timeout)
+            value = self.backend.get(key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+            return self._compute_and_store(key, compute)
+
+        try:
+            if not self.backend.shared:
+                return self._compute_and_store(key, compute)
+            return self._compute_with_backend_lock(key, compute)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            event.set()
+
+    def _compute_with_backend_lock(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        lock_key = f"lock:{key}"
+        token = f"{os.getpid()}:{uuid.uuid4().hex}".encode()
+        if self.backend.add(lock_key, token, self.lock_timeout):
+            try:
+                return self._compute_and_store(key, compute)
+            finally:
+                self.backend.delete_if_equals(lock_key, token)
+
+        # Another worker is computing this plan; wait for its result while it holds the lock
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = self.backend.get(key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+            if self.backend.get(lock_key) is None:
+                break
+        return self._compute_and_store(key, compute)
+
+    def _compute_and_store(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._counter_lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced}
+        stats.update(self.backend.stats())
+        return stats
@@ -0,0 +1,67 @@
+"""
+In-process statistical profiler for live workers.
+
+SamplingProfiler wakes up every interval, reads the current stack of the
+threads it is asked to watch (sys._current_frames(), no tracing hooks, so
+the profiled code runs at full speed between samples) and counts identical
+stacks. The result is in the collapsed-stack format used by flamegraph.pl,
+speedscope and similar tools: one "root;caller;...;leaf count" line per
+distinct stack.
+
+flaskapi exposes it at POST /admin/profile, disabled unless configured; see
+profile_worker() there.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+
+def _frame_label(frame, with_lines: bool) -> str:
+    code = frame.f_code
+    label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+    return f"{label}:{frame.f_lineno}" if with_lines else label
+
+
+class SamplingProfiler:
+    """
+    Samples thread stacks for a fixed duration.
+
+    thread_filter(ident) selects the threads to sample (all but the
+    profiling thread by default). with_lines adds line numbers to frames,
+    which splits stacks further but pinpoints hot lines.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_filter: Optional[Callable[[int], bool]] = None,
+                 with_lines: bool = False):
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self.with_lines = with_lines
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def _collapse(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame, self.with_lines))
+            frame = frame.f_back
+        return ';'.join(reversed(labels))
+
+    def run(self, duration: float) -> 'SamplingProfiler':
+        """Sample for duration seconds on the calling thread, which is never sampled itself."""
+        own_ident = threading.get_ident()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or (self.thread_filter is not None and not self.thread_filter(ident)):
+                    continue
+                self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
@@ -0,0 +1,185 @@
+"""
+Columnar, read-only view of the recipe catalogue used on the planning hot path.
+
+MealPlanner keeps its pandas DataFrame for model training, but day generation
+only needs a few numbers per recipe. RecipeStore holds those as contiguous
+numpy arrays indexed by row position (the same positions as MealPlanner.data),
+plus a deduplicated title table, so sampling a meal is an integer lookup
+instead of building a row Series.
+"""
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Serving sizes the planner is allowed to suggest: 0.5, 1.0, ..., 5.0
+ALLOWED_SERVINGS = np.arange(1, 11) * 0.5
+MIN_SERVINGS = float(ALLOWED_SERVINGS[0])
+MAX_SERVINGS = float(ALLOWED_SERVINGS[-1])
+
+MACRO_COLUMNS = ('carbohydrates', 'protein', 'fat')
+
+
+def round_servings(servings: np.ndarray) -> np.ndarray:
+    """
+    Snap servings onto the 0.5-5.0 grid.
+
+    Values are clamped to the grid first; exact ties (e.g. 1.25) go to the
+    smaller serving, matching the previous min(allowed, key=...) rounding.
+    """
+    clipped = np.clip(np.asarray(servings, dtype=np.float64), MIN_SERVINGS, MAX_SERVINGS)
+    return np.ceil(clipped * 2 - 0.5) / 2
+
+
+def optimal_servings(calories: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Servings that bring each recipe closest to its calorie target (1 serving if calories <= 0)."""
+    calories = np.asarray(calories, dtype=np.float64)
+    targets = np.broadcast_to(np.asarray(targets, dtype=np.float64), calories.shape)
+    ideal = np.divide(targets, calories, out=np.ones_like(calories), where=calories > 0)
+    return np.where(calories > 0, round_servings(ideal), 1.0)
+
+
+def plain_number(value) -> Union[int, float]:
+    """Native int for whole numbers and float otherwise, so plans serialize as before."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+@dataclass(frozen=True, eq=False)
+class RecipeStore:
+    titles: np.ndarray           # unique titles (object), indexed by title_id
+    title_id: np.ndarray         # int32 per recipe
+    calories: np.ndarray         # float64 per recipe
+    macros: np.ndarray           # float64 (n_recipes, len(MACRO_COLUMNS))
+    dietary_bitmask: np.ndarray  # uint16 per recipe
+    meal_type: np.ndarray        # uint8 per recipe (MEAL_TYPE_* bit flags)
+    serving_calories: np.ndarray  # float64 (n_recipes, len(ALLOWED_SERVINGS)) calorie lattice
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame, dietary_bitmask: np.ndarray,
+                   meal_type: np.ndarray) -> 'RecipeStore':
+        title_id, titles = pd.factorize(data['title'])
+        calories = np.ascontiguousarray(data['calories'].to_numpy(dtype=np.float64))
+        # A few scraped rows carry text in the macro columns ('32 12%'); those become NaN
+        macros = data.reindex(columns=list(MACRO_COLUMNS)).apply(pd.to_numeric, errors='coerce')
+        macros = macros.to_numpy(dtype=np.float64)
+        store = cls(
+            titles=np.asarray(titles, dtype=object),
+            title_id=np.ascontiguousarray(title_id, dtype=np.int32),
+            calories=calories,
+            macros=np.ascontiguousarray(macros),
+            dietary_bitmask=np.ascontiguousarray(dietary_bitmask),
+            meal_type=np.ascontiguousarray(meal_type),
+            serving_calories=np.ascontiguousarray(calories[:, None] * ALLOWED_SERVINGS[None, :]),
+        )
+        for array in (store.titles, store.title_id, store.calories, store.macros, store.serving_calories):
+            array.flags.writeable = False
+        return store
+
+    def __len__(self) -> int:
+        return len(self.calories)
+
+    @property
+    def n_titles(self) -> int:
+        return len(self.titles)
+
+    def title(self, position: int) -> str:
+        return self.titles[self.title_id[position]]
+
+    @cached_property
+    def _title_positions(self) -> Dict[str, np.ndarray]:
+        order = np.argsort(self.title_id, kind='stable')
+        bounds = np.searchsorted(self.title_id[order], np.arange(self.n_titles + 1))
+        return {title: order[bounds[i]:bounds[i + 1]] for i, title in enumerate(self.titles)}
+
+    def position_for_title(self, title: str, calories: Optional[float] = None) -> int:
+        """
+        Recipe position for a title taken from a plan; KeyError if it is not in the catalogue.
+
+        A few titles appear in both CSVs; calories (when known) picks the matching row.
+        """
+        positions = self._title_positions[title]
+        if calories is None or len(positions) == 1:
+            return int(positions[0])
+        return int(positions[np.abs(self.calories[positions] - float(calories)).argmin()])
+
+    def meal_record(self, position: int, servings: float) -> Dict:
+        """One meal in the shape the API returns: title, calories, servings, total_calories."""
+        calories = self.calories[position]
+        return {
+            'title': self.title(position),
+            'calories': plain_number(calories),
+            'servings': plain_number(servings),
+            'total_calories': plain_number(calories * servings),
+        }
+
+
+class CandidatePool:
+    """
+    Recipe positions allowed for one meal type, kept sorted by calories.
+
+    Because calories are sorted, the recipes within a calorie window form a
+    contiguous slice found with two binary searches, so window queries are
+    O(log n) and return views rather than copies.
+    """
+
+    def __init__(self, positions: np.ndarray, store: RecipeStore):
+        order = np.argsort(store.calories[positions], kind='stable')
+        self.positions = np.ascontiguousarray(positions[order])
+        self.calories = np.ascontiguousarray(store.calories[self.positions])
+        self.positions.flags.writeable = False
+        self.calories.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def size(self) -> int:
+        return len(self.positions)
+
+    def window_bounds(self, targets, margin: float, min_options: int = 1,
+                      usable: Optional[np.ndarray] = None):
+        """
+        Slice bounds [lo, hi) of recipes with calories in target +/- margin.
+
+        targets may be a scalar or an array (one window per user). Windows
+        holding fewer than min_options recipes are widened by doubling their
+        margin until they do, or until they cover the whole pool. With usable
+        (a bool per pool index, or one row of them per target), only usable
+        recipes count toward min_options.
+        """
+        targets = np.asarray(targets, dtype=np.float64)
+        n = len(self.calories)
+        if usable is None:
+            def count(lo, hi):
+                return hi - lo
+        else:
+            # Usable recipes in [lo, hi) from prefix sums along the pool
+            prefix = np.zeros(np.shape(usable)[:-1] + (n + 1,), dtype=np.int64)
+            np.cumsum(usable, axis=-1, out=prefix[..., 1:])
+            if prefix.ndim == 1:
+                def count(lo, hi):
+                    return prefix[hi] - prefix[lo]
+            else:
+                rows = np.arange(len(prefix))
+
+                def count(lo, hi):
+                    return prefix[rows, hi] - prefix[rows, lo]
+        margins = np.full(targets.shape, max(float(margin), 1.0))
+        lo = np.searchsorted(self.calories, targets - margins, side='left')
+        hi = np.searchsorted(self.calories, targets + margins, side='right')
+        narrow = (count(lo, hi) < min_options) & ((lo > 0) | (hi < n))
+        while narrow.any():
+            margins = np.where(narrow, margins * 2, margins)
+            lo = np.where(narrow, np.searchsorted(self.calories, targets - margins, side='left'), lo)
+            hi = np.where(narrow, np.searchsorted(self.calories, targets + margins, side='right'), hi)
+            narrow = (count(lo, hi) < min_options) & ((lo > 0) | (hi < n))
+        return lo, hi
+
+    def calorie_window(self, target: float, margin: float, min_options: int = 1,
+                       usable: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions with calories in target +/- margin (widened if needed, see window_bounds), as a view."""
+        lo, hi = self.window_bounds(target, margin, min_options, usable)
+        return self.positions[int(lo):int(hi)]
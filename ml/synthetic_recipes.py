@@ -0,0 +1,143 @@
+"""
+Synthetic recipe catalogues for scale testing.
+
+Writes breakfast and lunch/dinner CSVs with the same columns as the shipped
+ones, at any size:
+
+    python synthetic_recipes.py --rows 100000 --output synthetic
+    python benchmark.py --synthetic 100000
+
+Every synthetic recipe is a perturbed copy of a random template row from the
+real CSV of the same meal type:
+
+* dietary flags are copied from the template (with a small flip probability),
+  so their joint distribution and their correlation with the nutrients
+  (vegetarian and low-purine, low-fat and fat grams, ...) follow the real data;
+* all nutrient columns are scaled by one log-normal factor per recipe, which
+  keeps macro proportions intact; text columns such as '32 12%' keep their
+  format with the leading number scaled;
+* calories stay within the 0-2500 range the planner's calorie bands cover;
+* titles are the template's with a descriptor and a running number, unique
+  within each file, and a share of lunch/dinner titles (like in the shipped
+  data) reuse breakfast titles.
+"""
+import argparse
+import os
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BREAKFAST_TEMPLATE = os.path.join(HERE, 'bf_final_updated_recipes_1.csv')
+LUNCH_TEMPLATE = os.path.join(HERE, 'lunch_final_updated_recipes_1.csv')
+
+NUTRIENT_COLUMNS = (
+    'calories', 'carbohydrates', 'protein', 'fat', 'saturated_fat', 'polyunsaturated_fat',
+    'monounsaturated_fat', 'trans_fat', 'cholesterol', 'sodium', 'potassium', 'fiber', 'sugar',
+    'vitamin_a', 'vitamin_c', 'calcium', 'iron',
+)
+DIETARY_COLUMNS = (
+    'Vegetarian', 'Low-Purine', 'Low-fat/Heart-Healthy', 'Low-Sodium', 'Lactose-free',
+    'Peanut Allergy', 'Shellfish Allergy', 'Fish Allergy', 'Halal or Kosher',
+)
+TITLE_DESCRIPTORS = (
+    'Classic', 'Easy', 'Homestyle', 'Spicy', 'Garlic', 'Crispy', 'Quick', 'Savory',
+    'Hearty', 'Light', 'Baked', 'Grilled', 'Creamy', 'Zesty', 'Smoky', 'Special',
+)
+MAX_CALORIES = 2500
+# Share of lunch/dinner titles that also appear in the breakfast file (about 7% in the real data)
+DEFAULT_OVERLAP = 0.07
+
+
+def _scale_column(column: pd.Series, factors: np.ndarray) -> pd.Series:
+    """Scale a nutrient column; for text values like '32 12%' only the leading number changes."""
+    if pd.api.types.is_numeric_dtype(column):
+        scaled = np.round(column.to_numpy(dtype=float) * factors)
+        return pd.Series(scaled, index=column.index).astype(column.dtype, errors='ignore')
+    parts = column.astype(str).str.extract(r'^\s*(\d+(?:\.\d+)?)(.*)$')
+    numbers = pd.to_numeric(parts[0], errors='coerce')
+    scaled = np.round(numbers * factors).astype('Int64').astype(str) + parts[1].fillna('')
+    return scaled.where(numbers.notna(), column)
+
+
+def synthesize(template: pd.DataFrame, n_rows: int, rng: np.random.Generator,
+               noise: float = 0.15, flag_flip: float = 0.005, title_offset: int = 0) -> pd.DataFrame:
+    """n_rows synthetic recipes drawn from template (one meal type), same columns and order."""
+    template = template.dropna(subset=['calories']).reset_index(drop=True)
+    rows = template.iloc[rng.integers(len(template), size=n_rows)].reset_index(drop=True)
+
+    factors = rng.lognormal(mean=0.0, sigma=noise, size=n_rows)
+    # Keep calories inside the banded range; the factor applies to every nutrient alike
+    calories = rows['calories'].to_numpy(dtype=float)
+    factors = np.minimum(factors, MAX_CALORIES / np.maximum(calories, 1.0))
+    for column in NUTRIENT_COLUMNS:
+        if column in rows:
+            rows[column] = _scale_column(rows[column], factors)
+    rows['calories'] = rows['calories'].clip(lower=1).astype(int)
+
+    for column in DIETARY_COLUMNS:
+        if column in rows:
+            flags = rows[column].fillna(False).to_numpy(dtype=bool)
+            rows[column] = flags ^ (rng.random(n_rows) < flag_flip)
+
+    descriptors = np.asarray(TITLE_DESCRIPTORS, dtype=object)[rng.integers(len(TITLE_DESCRIPTORS), size=n_rows)]
+    numbers = np.arange(title_offset + 1, title_offset + n_rows + 1).astype(str)
+    rows['title'] = descriptors + ' ' + rows['title'].astype(str).to_numpy(dtype=object) + ' No. ' + numbers
+    return rows[template.columns]
+
+
+def generate_catalogue(n_breakfast: int, n_lunch: int, seed: int = 0, noise: float = 0.15,
+                       overlap: float = DEFAULT_OVERLAP, breakfast_template: str = BREAKFAST_TEMPLATE,
+                       lunch_template: str = LUNCH_TEMPLATE) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(breakfast, lunch) synthetic DataFrames; the same seed gives the same catalogue."""
+    rng = np.random.default_rng(seed)
+    breakfast = synthesize(pd.read_csv(breakfast_template), n_breakfast, rng, noise)
+    lunch = synthesize(pd.read_csv(lunch_template), n_lunch, rng, noise, title_offset=n_breakfast)
+    if overlap > 0 and n_breakfast and n_lunch:
+        shared = rng.random(n_lunch) < overlap
+        picks = rng.choice(n_breakfast, size=int(shared.sum()), replace=n_breakfast < shared.sum())
+        lunch.loc[shared, 'title'] = breakfast['title'].to_numpy()[picks]
+    return breakfast, lunch
+
+
+def write_catalogue(output_dir: str, n_breakfast: int, n_lunch: int, seed: int = 0,
+                    **kwargs) -> Tuple[str, str]:
+    """Write breakfast.csv and lunch.csv into output_dir; returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    breakfast, lunch = generate_catalogue(n_breakfast, n_lunch, seed=seed, **kwargs)
+    breakfast_path = os.path.join(output_dir, 'breakfast.csv')
+    lunch_path = os.path.join(output_dir, 'lunch.csv')
+    breakfast.to_csv(breakfast_path, index=False)
+    lunch.to_csv(lunch_path, index=False)
+    return breakfast_path, lunch_path
+
+
+def split_rows(total: int) -> Tuple[int, int]:
+    """Breakfast/lunch split of a total row count in the shipped catalogue's proportions (about 1:4)."""
+    n_breakfast = max(1, round(total * 0.2))
+    return n_breakfast, max(1, total - n_breakfast)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic recipe CSVs for scale testing')
+    parser.add_argument('--rows', type=int, default=100000, help='Total recipes (split about 1:4)')
+    parser.add_argument('--breakfast-rows', type=int, help='Breakfast recipes (overrides the split)')
+    parser.add_argument('--lunch-rows', type=int, help='Lunch/dinner recipes (overrides the split)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--noise', type=float, default=0.15, help='Sigma of the log-normal nutrient scaling')
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP,
+                        help='Share of lunch/dinner titles reused from breakfast')
+    parser.add_argument('--output', default='synthetic', help='Output directory')
+    args = parser.parse_args()
+
+    n_breakfast, n_lunch = split_rows(args.rows)
+    n_breakfast = args.breakfast_rows if args.breakfast_rows is not None else n_breakfast
+    n_lunch = args.lunch_rows if args.lunch_rows is not None else n_lunch
+    paths = write_catalogue(args.output, n_breakfast, n_lunch, seed=args.seed,
+                            noise=args.noise, overlap=args.overlap)
+    print(f"Wrote {n_breakfast} breakfast and {n_lunch} lunch/dinner recipes to {', '.join(paths)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -107,23 +107,6 @@ class MealPlanner:
             if pref_array[i] and any(x in column.lower() for x in ['allergy', 'halal', 'kosher']):
                 filtered_data = filtered_data[filtered_data[column] == True]
         
-        # Step 2: Use Random Forest to select meals within appropriate calorie ranges
-        target_prediction_counts = {}
-        
-        # Get calorie range distribution from RandomForest predictions
-        for meal_type in ['breakfast', 'lunch/dinner']:
-            if meal_type == 'breakfast':
-                meal_data = filtered_data[filtered_data['title'].isin(self.breakfast_data['title'])]
-            else:
-                meal_data = filtered_data[filtered_data['title'].isin(self.lunch_data['title'])]
-                
-            if not meal_data.empty:
-                # Use DataFrame with proper column names for prediction
-                calories_df = pd.DataFrame({'calories': meal_data['calories']})
-                predictions = self.rf_model.predict(calories_df)
-                unique_predictions, counts = np.unique(predictions, return_counts=True)
-                target_prediction_counts[meal_type] = dict(zip(unique_predictions, counts))
-        
         temp_data = filtered_data.copy()
         preference_constraints = ['Vegetarian', 'Low-Purine', 'Low-fat/Heart-Healthy', 
                         'Low-Sodium', 'Lactose-free']
@@ -0,0 +1,146 @@
+"""
+Checks for the batched weekly-plan path (MealPlanner.generate_weekly_plans_batch
+and batch_sampler.PoolSampler).
+
+    python test_batch_sampler.py      (or: python -m pytest test_batch_sampler.py)
+
+* batch plans keep the at-most-twice and lunch != dinner rules whenever the
+  candidate pools hold enough distinct titles, with and without a calorie margin;
+* a seeded /predict_meal_plan/batch item gets the plan /predict_meal_plan
+  returns for the same body and seed;
+* batches over tiny pools (fewer titles than meals in a week, titles listed
+  several times) still complete with a full week for every user.
+
+Unseeded batch items are the ones PoolSampler plans, so the rule checks use
+those. Models are trained once and shared between the planners built here.
+"""
+import os
+import tempfile
+import warnings
+from collections import Counter
+
+import numpy as np
+
+from flaskapi import (
+    MEAL_TYPE_BREAKFAST, MEAL_TYPE_LUNCH_DINNER, WEEK_DAYS, DietaryPreferences, MealPlanner,
+    PlanRequest, app,
+)
+from synthetic_recipes import generate_catalogue
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BREAKFAST_PATH = os.path.join(HERE, 'bf_final_updated_recipes_1.csv')
+LUNCH_PATH = os.path.join(HERE, 'lunch_final_updated_recipes_1.csv')
+
+USERS = 200
+# Distinct titles a pool needs before a day-by-day week is sure to keep a rule. 7 breakfasts
+# need 4 titles; lunch/dinner needs 8, since with 7 the last day may have only one title left
+MIN_TITLES_AT_MOST_TWICE = {MEAL_TYPE_BREAKFAST: 4, MEAL_TYPE_LUNCH_DINNER: 8}
+MIN_TITLES_LUNCH_NOT_DINNER = 2
+
+_planners = {}
+
+
+def shipped_planner(**options) -> MealPlanner:
+    """Planner over the shipped CSVs; models are trained once and reused."""
+    key = tuple(sorted(options.items()))
+    if key not in _planners:
+        base = _planners.get(())
+        models = (base.rf_model, base.kmeans_model, base.scaler) if base is not None else None
+        _planners[key] = MealPlanner(BREAKFAST_PATH, LUNCH_PATH, seed=0, models=models, **options)
+    return _planners[key]
+
+
+def pool_titles(planner: MealPlanner, preferences: DietaryPreferences, category: int) -> int:
+    pool = planner._candidate_pools(preferences)[category]
+    return np.unique(planner.store.title_id[pool.positions]).size
+
+
+def rule_violations(planner: MealPlanner, preferences: DietaryPreferences, plans) -> Counter:
+    """Counts of weeks breaking each rule the preference set's pools allow."""
+    check_repeats = {category: pool_titles(planner, preferences, category) >= needed
+                     for category, needed in MIN_TITLES_AT_MOST_TWICE.items()}
+    check_lunch_dinner = pool_titles(planner, preferences, MEAL_TYPE_LUNCH_DINNER) >= MIN_TITLES_LUNCH_NOT_DINNER
+
+    violations = Counter()
+    for plan in plans:
+        breakfasts = Counter(plan[day]['Breakfast']['title'] for day in WEEK_DAYS)
+        lunch_dinners = Counter(plan[day][meal]['title'] for day in WEEK_DAYS for meal in ('Lunch', 'Dinner'))
+        if check_repeats[MEAL_TYPE_BREAKFAST] and max(breakfasts.values()) > 2:
+            violations['breakfast used more than twice'] += 1
+        if check_repeats[MEAL_TYPE_LUNCH_DINNER] and max(lunch_dinners.values()) > 2:
+            violations['lunch/dinner used more than twice'] += 1
+        if check_lunch_dinner and any(plan[day]['Lunch']['title'] == plan[day]['Dinner']['title']
+                                      for day in WEEK_DAYS):
+            violations['lunch == dinner'] += 1
+    return violations
+
+
+def test_batch_variety_rules():
+    rng = np.random.default_rng(0)
+    # Every single flag plus a spread of random combinations, including restrictive ones
+    masks = [0] + [1 << bit for bit in range(9)] + list(rng.choice(512, size=20, replace=False))
+    for options in ({}, {'calorie_margin': 150.0}, {'calorie_margin': 50.0}):
+        planner = shipped_planner(**options)
+        for mask in masks:
+            preferences = DietaryPreferences.from_bitmask(int(mask))
+            tdees = rng.integers(1200, 3500, size=USERS)
+            plans = planner.generate_weekly_plans_batch(
+                [PlanRequest(tdee=int(tdee), preferences=preferences) for tdee in tdees])
+            plans = [plan for plan in plans if not isinstance(plan, ValueError)]
+            violations = rule_violations(planner, preferences, plans)
+            assert not violations, f"mask {mask} with {options}: {dict(violations)} in {len(plans)} weeks"
+
+
+def test_seeded_batch_item_matches_single_request():
+    client = app.test_client()
+    body = {'age': 34, 'weight': 68, 'height': 172, 'gender': 'female',
+            'activity_level': 'lightly_active', 'dietary_restrictions': ['vegetarian'], 'allergies': 'peanut'}
+    for seed in (0, 7, 12345):
+        single = client.post('/predict_meal_plan', json={**body, 'seed': seed})
+        # Unseeded neighbours send the rest of the batch through the sampler
+        batch = client.post('/predict_meal_plan/batch', json={'requests': [body, {**body, 'seed': seed}, body]})
+        assert single.status_code == 200 and batch.status_code == 200
+        assert batch.get_json()['predicted_meal_plans'][1] == single.get_json(), f"seed {seed}"
+
+
+def tiny_catalogue(directory: str, breakfast_titles: int, lunch_titles: int):
+    """CSVs of 12 breakfast and 20 lunch/dinner rows cycling through a few titles each."""
+    breakfast, lunch = generate_catalogue(12, 20, seed=1, overlap=0)
+    breakfast['title'] = [f"Breakfast {i % breakfast_titles}" for i in range(len(breakfast))]
+    lunch['title'] = [f"Lunch {i % lunch_titles}" for i in range(len(lunch))]
+    # No dietary flags set, so the catalogue only plans without preferences
+    paths = os.path.join(directory, 'breakfast.csv'), os.path.join(directory, 'lunch.csv')
+    breakfast.to_csv(paths[0], index=False)
+    lunch.to_csv(paths[1], index=False)
+    return paths
+
+
+def test_tiny_pools_complete():
+    preferences = DietaryPreferences()
+    with tempfile.TemporaryDirectory() as directory:
+        for breakfast_titles, lunch_titles in ((1, 1), (2, 3), (3, 6)):
+            paths = tiny_catalogue(directory, breakfast_titles, lunch_titles)
+            for options in ({}, {'calorie_margin': 50.0}):
+                with warnings.catch_warnings():
+                    # A handful of rows is too few for the models to fit cleanly; plans don't depend on them
+                    warnings.simplefilter('ignore')
+                    planner = MealPlanner(*paths, seed=0, **options)
+                requests = [PlanRequest(tdee=int(tdee), preferences=preferences)
+                            for tdee in np.linspace(1200, 3500, USERS)]
+                plans = planner.generate_weekly_plans_batch(requests)
+                assert len(plans) == USERS
+                for plan in plans:
+                    assert not isinstance(plan, ValueError), plan
+                    assert list(plan) == list(WEEK_DAYS)
+                violations = rule_violations(planner, preferences, plans)
+                assert not violations, f"{breakfast_titles}/{lunch_titles} titles with {options}: {dict(violations)}"
+
+
+def main():
+    for check in (test_batch_variety_rules, test_seeded_batch_item_matches_single_request, test_tiny_pools_complete):
+        check()
+        print(f"{check.__name__}: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Lightweight span tracing for the planner's hot path.
+
+MealPlanner wraps its main stages in tracer.span(name, **attributes) blocks.
+A Tracer without an exporter (NULL_TRACER, the default) hands back one shared
+no-op span, so disabled tracing costs a method call per block. With an
+exporter, each finished span is passed on as a dict:
+
+    {"name", "trace_id", "span_id", "parent_id", "start" (epoch seconds),
+     "duration_ms", "thread", "pid", "attributes"}
+
+Spans opened while another span is active on the same thread become its
+children. sample_rate picks whole traces: an unsampled root span silences
+everything beneath it.
+
+Exporters: InMemoryExporter keeps the latest spans for inspection (tests,
+benchmarks, a debugging shell); FileExporter appends one JSON line per span,
+which is safe with several worker processes writing to one file.
+"""
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class SpanExporter(ABC):
+    """Receives finished spans as dicts."""
+
+    @abstractmethod
+    def export(self, span: Dict):
+        ...
+
+    def shutdown(self):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps the most recent max_spans spans in memory."""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, name: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            return [span for span in self._spans if name is None or span['name'] == name]
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """Appends spans to path as JSON lines, one write per span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', buffering=1, encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, span: Dict):
+        line = json.dumps(span, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    """Root of a trace that was not sampled; marks the thread so child spans stay no-ops."""
+    __slots__ = ('_stack',)
+
+    def __init__(self, stack: list):
+        self._stack = stack
+
+    def __enter__(self):
+        self._stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stack.pop()
+        return False
+
+
+class Span:
+    __slots__ = ('_tracer', '_stack', 'name', 'trace_id', 'span_id', 'parent_id',
+                 'attributes', 'start', '_perf_start')
+
+    def __init__(self, tracer: 'Tracer', stack: list, name: str, trace_id: str,
+                 parent_id: Optional[str], attributes: Dict):
+        self._tracer = tracer
+        self._stack = stack
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._stack.append(self)
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._perf_start) * 1000
+        self._stack.pop()
+        if exc_type is not None:
+            self.attributes['error'] = f"{exc_type.__name__}: {exc}"
+        self._tracer._export({
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': duration_ms,
+            'thread': threading.current_thread().name,
+            'pid': os.getpid(),
+            'attributes': self.attributes,
+        })
+        return False
+
+
+class Tracer:
+    """Creates spans and hands finished ones to exporter; disabled when exporter is None."""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, **attributes):
+        if self.exporter is None:
+            return NOOP_SPAN
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if stack:
+            parent = stack[-1]
+            if isinstance(parent, _UnsampledSpan):
+                return NOOP_SPAN
+            return Span(self, stack, name, parent.trace_id, parent.span_id, attributes)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return _UnsampledSpan(stack)
+        return Span(self, stack, name, f"{random.getrandbits(128):032x}", None, attributes)
+
+    def _export(self, span: Dict):
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            # Tracing must never fail the request it is observing
+            print(f"Failed to export span {span['name']}: {e}")
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+NULL_TRACER = Tracer()
@@ -0,0 +1,143 @@
+"""
+Whole-week plan improvement by simulated annealing.
+
+The planner builds a week greedily, one day at a time, so early days can use
+up the recipes that would have suited later days best. solve_week() takes
+that greedy week as a warm start and searches over all 21 slots at once:
+
+* a move either swaps one slot's recipe for another from its candidate pool
+  (at the serving closest to the slot's target) or shifts one slot's serving
+  by half a serving;
+* the cost is each day's deviation from the 40/30/30 targets plus its
+  deviation from the rice-adjusted TDEE, with heavy penalties for a title
+  used more than max_repeats times in the week (breakfast and lunch/dinner
+  counted separately) and for lunch and dinner sharing a title;
+* moves are accepted by the Metropolis rule while the temperature falls
+  linearly to zero over the time budget, and the best week seen is returned.
+
+Dietary flags need no extra handling: candidates only ever come from the
+preference-filtered pools, which is also where the warm start was drawn.
+"""
+import math
+import time
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from recipe_store import ALLOWED_SERVINGS, RecipeStore
+
+# Random numbers are drawn in blocks to keep per-move overhead low
+_BLOCK = 256
+
+
+def servings_to_index(servings: np.ndarray) -> np.ndarray:
+    """Grid index into ALLOWED_SERVINGS for servings already on the 0.5 grid."""
+    return np.clip(np.rint(np.asarray(servings) * 2).astype(int) - 1, 0, len(ALLOWED_SERVINGS) - 1)
+
+
+def solve_week(store: RecipeStore, breakfast_pool: np.ndarray, lunch_dinner_pool: np.ndarray,
+               targets: Sequence[float], adjusted_tdee: float, meals: np.ndarray,
+               serving_index: np.ndarray, rng: np.random.Generator, budget_ms: float = 20.0,
+               max_repeats: int = 2,
+               prior_counts: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Improve a week of (n_days, 3) meal positions and serving indices within budget_ms.
+
+    Slot 0 of each day is breakfast (drawn from breakfast_pool), slots 1 and 2
+    are lunch and dinner (from lunch_dinner_pool). prior_counts optionally
+    holds per-title (breakfast, lunch/dinner) usage from the days just before
+    this week, which then count toward max_repeats. Returns new arrays; the
+    inputs are left untouched.
+    """
+    lattice = store.serving_calories
+    title_id = store.title_id
+    targets = [float(t) for t in targets]
+    adjusted_tdee = float(adjusted_tdee)
+    penalty = max(adjusted_tdee, 1.0)
+    pools = (breakfast_pool, lunch_dinner_pool, lunch_dinner_pool)
+    best_serving = [
+        np.abs(lattice[pool] - target).argmin(axis=1) if len(pool) else np.zeros(0, dtype=int)
+        for pool, target in zip(pools, targets)
+    ]
+    n_days = len(meals)
+    n_servings = len(ALLOWED_SERVINGS)
+
+    meals = np.array(meals, dtype=np.int64)
+    serving_index = np.array(serving_index, dtype=np.int64)
+    breakfast_counts = np.bincount(title_id[meals[:, 0]], minlength=store.n_titles)
+    lunch_dinner_counts = np.bincount(title_id[meals[:, 1:]].ravel(), minlength=store.n_titles)
+    if prior_counts is not None:
+        breakfast_counts += prior_counts[0]
+        lunch_dinner_counts += prior_counts[1]
+
+    def day_cost(day: int) -> float:
+        calories = lattice[meals[day], serving_index[day]]
+        cost = (abs(calories[0] - targets[0]) + abs(calories[1] - targets[1])
+                + abs(calories[2] - targets[2]) + abs(calories.sum() - adjusted_tdee))
+        if title_id[meals[day, 1]] == title_id[meals[day, 2]]:
+            cost += penalty
+        return float(cost)
+
+    def excess(count: int) -> int:
+        return max(0, count - max_repeats)
+
+    day_costs = [day_cost(day) for day in range(n_days)]
+    current = sum(day_costs) + penalty * (
+        sum(excess(c) for c in breakfast_counts[breakfast_counts > max_repeats])
+        + sum(excess(c) for c in lunch_dinner_counts[lunch_dinner_counts > max_repeats])
+    )
+    best = (current, meals.copy(), serving_index.copy())
+
+    start_temperature = max(1.0, 0.02 * adjusted_tdee)
+    start = time.perf_counter()
+    budget = budget_ms / 1000.0
+    elapsed = 0.0
+    while elapsed < budget:
+        temperature = start_temperature * (1.0 - elapsed / budget)
+        days = rng.integers(n_days, size=_BLOCK)
+        slots = rng.integers(3, size=_BLOCK)
+        kinds = rng.random(_BLOCK)
+        picks = rng.random(_BLOCK)
+        accepts = rng.random(_BLOCK)
+
+        for day, slot, kind, pick, accept in zip(days, slots, kinds, picks, accepts):
+            day, slot = int(day), int(slot)
+            old_meal, old_serving = meals[day, slot], serving_index[day, slot]
+            counts = breakfast_counts if slot == 0 else lunch_dinner_counts
+
+            if kind < 0.7 and len(pools[slot]) > 1:
+                # Replace the recipe, at the serving closest to the slot's target
+                choice = int(pick * len(pools[slot]))
+                new_meal, new_serving = pools[slot][choice], best_serving[slot][choice]
+            else:
+                # Shift the serving by one grid step
+                new_meal = old_meal
+                new_serving = old_serving + (1 if pick < 0.5 else -1)
+                if not 0 <= new_serving < n_servings:
+                    continue
+            if new_meal == old_meal and new_serving == old_serving:
+                continue
+
+            old_title, new_title = title_id[old_meal], title_id[new_meal]
+            repeat_delta = 0
+            if old_title != new_title:
+                repeat_delta = (excess(counts[old_title] - 1) - excess(counts[old_title])
+                                + excess(counts[new_title] + 1) - excess(counts[new_title]))
+
+            meals[day, slot], serving_index[day, slot] = new_meal, new_serving
+            new_day_cost = day_cost(day)
+            delta = new_day_cost - day_costs[day] + penalty * repeat_delta
+
+            if delta <= 0 or (temperature > 0 and accept < math.exp(-delta / temperature)):
+                day_costs[day] = new_day_cost
+                counts[old_title] -= 1
+                counts[new_title] += 1
+                current += delta
+                if current < best[0] - 1e-9:
+                    best = (current, meals.copy(), serving_index.copy())
+            else:
+                meals[day, slot], serving_index[day, slot] = old_meal, old_serving
+
+        elapsed = time.perf_counter() - start
+
+    return best[1], best[2]
@@ -0,0 +1,39 @@
+"""
+Production entry point: gunicorn --config gunicorn.conf.py wsgi:app
+
+With preload_app (set in gunicorn.conf.py) this module is imported once in
+the gunicorn master, before any worker is forked. It loads the recipe data,
+models and every preference's candidate pool there and runs the warm-up
+plans, so workers start ready (see /ready) with all of it already in memory,
+sharing those pages copy-on-write instead of each loading its own copy.
+
+Python's garbage collector would still un-share those pages by writing to
+the headers of every object it scans, so loading runs with the collector
+disabled and the loaded objects are then moved to the permanent generation
+with gc.freeze(); collections in the workers only look at newer objects.
+"""
+import gc
+import os
+
+from flaskapi import app, planner_registry
+
+# Set to 0 to load and warm up the planner in each worker instead (no sharing)
+PRELOAD_PLANNER = os.environ.get('PRELOAD_PLANNER', '1') != '0'
+
+
+def preload():
+    gc.disable()
+    try:
+        planner = planner_registry.load()
+        pools = planner.precompute_candidate_pools()
+        planner_registry.warm_up()
+        print(f"Preloaded planner with {len(planner.store)} recipes and {pools} candidate pools")
+    finally:
+        gc.freeze()
+        gc.enable()
+
+
+if PRELOAD_PLANNER:
+    preload()
+
+__all__ = ['app']